@@ -1,23 +1,49 @@
 #!/usr/bin/env python3
 import logging
 from threading import Thread
-from time import sleep
+from time import monotonic, sleep
 from serial import Serial
-from ublox import StreamMuxDemux, UBXSerializer, StreamMuxDemuxError
-from pyubx2.ubxreader import UBXReader
+from ublox import StreamMuxDemux, UBXSerializer, UBXConfigLoader, StreamMuxDemuxError, RTCMEpochBatcher, UBXDispatcher, LogPipeline, CorrectionTracer, SerialCapture
 
 log = logging.getLogger('base')
 REPLUG_WAIT_TIME = 3
 
+# records logged per UBX message type and second, the rest is summarized
+LOG_BURST = 1
 
-def rtcm_handler(rtcm_stream):
+# UBX messages decoded and logged, others are only logged by their header
+LOGGED_UBX = ("NAV-SVIN", "ACK-ACK", "ACK-NAK")
+
+# write the RTCM frames of an epoch to the radio together, as soon as the epoch is complete
+FLUSH_ON_EPOCH = True
+
+# file to record RTCM latency traces to, None disables tracing
+TRACE_FILE = None
+
+# file to capture the raw receiver stream to for offline replay, None disables capturing
+CAPTURE_FILE = None
+
+
+def rtcm_handler(rtcm_stream, tracer=None):
     xbee_stream = None
     while True:
         try:
             xbee_stream = Serial("/dev/xbee", 115200, timeout=5)
+            batcher = RTCMEpochBatcher() if FLUSH_ON_EPOCH else None
             while True:
-                byte = rtcm_stream.read()
-                xbee_stream.write(byte)
+                # wake up in time to flush an epoch whose final MSM got lost
+                timeout = batcher.due_in(monotonic()) if batcher else None
+                frame = rtcm_stream.read_frame(timeout)
+                ready = batcher.flush_if_due(monotonic()) if batcher else []
+                if frame is not None:
+                    if tracer:
+                        tracer.stamp("arrival", frame.raw, frame.received_at)
+                    ready += batcher.add(frame) if batcher else [frame.raw]
+
+                for data in ready:
+                    xbee_stream.write(data)
+                    if tracer:
+                        tracer.stamp_data("transport", data)
 
         except StreamMuxDemuxError as e:
             log.error(e)
@@ -31,20 +57,28 @@ def rtcm_handler(rtcm_stream):
             sleep(REPLUG_WAIT_TIME)
 
 
+def log_message(frame, msg):
+    log.info(msg, extra={"msg_type": msg.identity})
+
+
+def log_frame(frame):
+    log.debug(frame, extra={"msg_type": frame.identity})
+
+
 def ubx_handler(ubx_stream):
+    dispatcher = UBXDispatcher(ubx_stream, default=log_frame)
+    for name in LOGGED_UBX:
+        dispatcher.subscribe(name, log_message)
+
     while True:
         try:
-            ubr = UBXReader(ubx_stream)
-            raw, msg = ubr.read()
-            log.info(msg)
+            dispatcher.run()
 
         except StreamMuxDemuxError as e:
             log.error(e)
             ubx_stream.owner.close()
             return
 
-        # TODO: except parse errors
-
         except Exception as e:
             log.error(e)
             # sleep(REPLUG_WAIT_TIME)
@@ -56,6 +90,9 @@ def main():
     TIMEOUT = 5
     log.info(f'Connecting to serial port {PORT}')
     original_stream = Serial(PORT, BAUDRATE, timeout=TIMEOUT)
+    if CAPTURE_FILE:
+        log.info(f'Capturing serial stream to {CAPTURE_FILE}')
+        original_stream = SerialCapture(original_stream, CAPTURE_FILE)
 
     # split serial stream into a stream for each protocol
     log.info(f'Splitting serial stream into a stream for each protocol')
@@ -64,9 +101,12 @@ def main():
     # load configuration
     CONFIG_FILE = "./config/base.yml"
     log.info(f'Loading configuration from {CONFIG_FILE}')
-    config = UBXSerializer.serialize(open(CONFIG_FILE, "r"))
-    streams.UBX.write(config)
-    # TODO: verify ubx answer
+    plan = UBXSerializer.plan(open(CONFIG_FILE, "r"))
+    failures = UBXConfigLoader(streams.UBX).apply(plan)
+    for failure in failures:
+        log.error(f'Configuration {failure.reason} after {failure.attempts} attempt(s): {failure.frame}')
+    if not failures:
+        log.info(f'Configuration acknowledged')
 
     # run UBX thread
     log.info(f'Creating a thread for handling UBX')
@@ -75,7 +115,8 @@ def main():
 
     # run RTCM thread
     log.info(f'Creating a thread for handling RTCM')
-    rtcm_thread = Thread(target=rtcm_handler, daemon=True, args=[streams.RTCM])
+    tracer = CorrectionTracer(TRACE_FILE, "base") if TRACE_FILE else None
+    rtcm_thread = Thread(target=rtcm_handler, daemon=True, args=[streams.RTCM, tracer])
     rtcm_thread.start()
 
     # cleanup
@@ -83,10 +124,14 @@ def main():
     rtcm_thread.join()
     streams.close()
     original_stream.close()
+    if tracer:
+        tracer.close()
 
 
 if __name__ == '__main__':
-    logging.basicConfig(format="%(levelname)s:%(name)s:%(asctime)s:  %(message)s", level=logging.DEBUG)
+    # log from a background thread, so slow output never stalls the handlers
+    LogPipeline(format="%(levelname)s:%(name)s:%(asctime)s:  %(message)s", level=logging.DEBUG,
+                burst=LOG_BURST).start()
 
     while True:
         try:
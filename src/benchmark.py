@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# Throughput and latency benchmark of StreamMuxDemux. Synthetic UBX, NMEA and
+# RTCM3 frames are written to a pty at baud-equivalent rates and consumed from
+# the demux streams; results are printed as JSON:
+#   ./benchmark.py --baud 460800 921600 1843200 --duration 5 --mix 1:1:4
+import argparse
+import json
+import os
+import struct
+import sys
+import tty
+from threading import Thread
+from time import monotonic, process_time, sleep
+from serial import Serial
+from ublox import StreamMuxDemux
+from ublox.StreamMuxDemux.UBloxChecksum import ubx_checksum, crc24q, nmea_checksum
+
+PROTOCOLS = ("UBX", "NMEA", "RTCM")
+SEQ = struct.Struct("<I")
+
+""" frames built ahead of time and cycled through, so checksumming stays out of the measurement """
+POOL_SIZE = 1024
+
+
+def ubx_frame(seq, size):
+    payload = SEQ.pack(seq) + bytes(max(size - 12, 0))
+    body = b"\x01\x07" + struct.pack("<H", len(payload)) + payload
+    return b"\xb5\x62" + body + bytes(ubx_checksum(body))
+
+
+def nmea_frame(seq, size):
+    body = f"GPGGA,{seq},".encode()
+    body += b"0" * max(size - len(body) - 6, 0)
+    return b"$" + body + b"*%02X\r\n" % nmea_checksum(body)
+
+
+def rtcm_frame(seq, size):
+    payload = b"\x43\x50" + SEQ.pack(seq) + bytes(max(size - 12, 0))          # message 1077
+    header = bytes([0xD3, len(payload) >> 8, len(payload) & 0xFF])
+    return header + payload + crc24q(header + payload).to_bytes(3, "big")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+class Generator(Thread):
+    """ Writes the frame mix to the pty master at bytes_per_second, from a pool built in the constructor """
+
+    def __init__(self, fd, bytes_per_second, duration, mix, sizes):
+        super().__init__(daemon=True)
+        self._fd = fd
+        self._rate = bytes_per_second
+        self._duration = duration
+        builders = {"UBX": ubx_frame, "NMEA": nmea_frame, "RTCM": rtcm_frame}
+        pattern = [protocol for protocol in PROTOCOLS for _ in range(mix[protocol])]
+        self._pool = []
+        for seq in range(POOL_SIZE - POOL_SIZE % len(pattern)):
+            protocol = pattern[seq % len(pattern)]
+            self._pool.append((protocol, builders[protocol](seq, sizes[protocol])))
+        self.sent = {protocol: 0 for protocol in PROTOCOLS}
+        self.sent_bytes = 0
+
+    def run(self):
+        start = monotonic()
+        seq = 0
+        pending = []
+        while True:
+            elapsed = monotonic() - start
+            if elapsed >= self._duration:
+                return
+
+            """ catch up with the byte budget of the elapsed time """
+            budget = int(elapsed * self._rate) - self.sent_bytes
+            while budget > 0:
+                protocol, frame = self._pool[seq % len(self._pool)]
+                pending.append(frame)
+                self.sent[protocol] += 1
+                budget -= len(frame)
+                self.sent_bytes += len(frame)
+                seq += 1
+
+            if pending:
+                data = memoryview(b"".join(pending))
+                pending = []
+                while data:
+                    data = data[os.write(self._fd, data):]
+            sleep(0.002)
+
+
+class Consumer(Thread):
+    def __init__(self, stream):
+        super().__init__(daemon=True)
+        self._stream = stream
+        self.frames = 0
+        self.bytes = 0
+        self.latencies = []
+        self.stopped = False
+
+    def run(self):
+        while not self.stopped:
+            try:
+                frame = self._stream.read_frame()
+            except Exception:
+                return
+            if frame is None:
+                continue
+            self.latencies.append(monotonic() - frame.received_at)
+            self.frames += 1
+            self.bytes += len(frame)
+
+
+def run(baud, duration, mix, sizes, chunk_size):
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    serial = Serial(os.ttyname(slave), baud, timeout=0.5)
+    streams = StreamMuxDemux(serial, ttl=5, chunk_size=chunk_size)
+
+    consumers = {protocol: Consumer(getattr(streams, protocol)) for protocol in PROTOCOLS}
+    for consumer in consumers.values():
+        consumer.start()
+
+    bytes_per_second = baud / 10                   # 8N1
+    generator = Generator(master, bytes_per_second, duration, mix, sizes)
+    cpu_start = process_time()
+    start = monotonic()
+    generator.start()
+
+    max_depth = 0
+    depths = []
+    while generator.is_alive():
+        sleep(0.1)
+        queues = streams.metrics()["reader"]["queues"]
+        depth = sum(q["depth"] for q in queues.values())
+        depths.append(depth)
+        max_depth = max(max_depth, depth)
+
+    """ let the pipeline drain """
+    sleep(1)
+    wall = monotonic() - start
+    cpu = process_time() - cpu_start
+    metrics = streams.metrics()
+
+    for consumer in consumers.values():
+        consumer.stopped = True
+    streams.close()
+    serial.close()
+    os.close(master)
+
+    received = sum(consumer.frames for consumer in consumers.values())
+    sent = sum(generator.sent.values())
+    half = len(depths) // 2
+    growing = bool(depths) and half > 0 and min(depths[half:]) > max(depths[:half])
+    latencies = [l for consumer in consumers.values() for l in consumer.latencies]
+
+    return {
+        "baud": baud,
+        "duration": duration,
+        "offered_bytes_per_s": bytes_per_second,
+        "sent_frames": dict(generator.sent),
+        "per_protocol": {
+            protocol: {
+                "frames": consumer.frames,
+                "frames_per_s": consumer.frames / duration,
+                "bytes_per_s": consumer.bytes / duration,
+                "latency_p50": percentile(consumer.latencies, 50),
+                "latency_p99": percentile(consumer.latencies, 99)
+            } for protocol, consumer in consumers.items()
+        },
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "cpu_s_per_mb": cpu / (generator.sent_bytes / 1e6) if generator.sent_bytes else None,
+        "cpu_utilization": cpu / wall,
+        "garbage_bytes": metrics["reader"]["garbage_bytes"],
+        "dropped": streams.dropped(),
+        "max_queue_depth": max_depth,
+        "lost_frames": sent - received,
+        "queues_growing": growing,
+        "keeps_up": received == sent and not growing
+    }
+
+
+def parse_mix(text):
+    weights = [int(weight) for weight in text.split(":")]
+    if len(weights) != 3:
+        raise argparse.ArgumentTypeError("mix must be UBX:NMEA:RTCM, e.g. 1:1:4")
+    return dict(zip(PROTOCOLS, weights))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StreamMuxDemux throughput and latency benchmark")
+    parser.add_argument("--baud", type=int, nargs="+", default=[115200, 460800, 921600],
+                        help="baud-equivalent rates to run, in increasing order")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per rate")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("1:1:4"), help="UBX:NMEA:RTCM frame ratio")
+    parser.add_argument("--ubx-size", type=int, default=100)
+    parser.add_argument("--nmea-size", type=int, default=72)
+    parser.add_argument("--rtcm-size", type=int, default=400)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    sizes = {"UBX": args.ubx_size, "NMEA": args.nmea_size, "RTCM": args.rtcm_size}
+    results = []
+    for baud in args.baud:
+        result = run(baud, args.duration, args.mix, sizes, args.chunk_size)
+        results.append(result)
+        print(f"{baud} baud: keeps up: {result['keeps_up']}, p99 {result['latency_p99']}", file=sys.stderr)
+
+    saturated = [result["baud"] for result in results if not result["keeps_up"]]
+    report = {
+        "results": results,
+        "saturation_baud": saturated[0] if saturated else None
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
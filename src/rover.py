@@ -3,22 +3,42 @@ import logging
 from threading import Thread
 from time import sleep
 from serial import Serial
-from ublox import StreamMuxDemux, UBXSerializer, StreamMuxDemuxError
-from pyubx2.ubxreader import UBXReader
+from ublox import StreamMuxDemux, UBXSerializer, UBXConfigLoader, StreamMuxDemuxError, RTCMReassembler, NMEAFilter, UBXDispatcher, LogPipeline, CorrectionTracer, SerialCapture
 
 
 log = logging.getLogger('rover')
 REPLUG_WAIT_TIME = 3
 
+# records logged per UBX message type and second, the rest is summarized
+LOG_BURST = 1
 
-def rtcm_handler(rtcm_stream):
+# UBX messages decoded and logged, others are only logged by their header
+LOGGED_UBX = ("NAV-STATUS", "RXM-RTCM", "ACK-ACK", "ACK-NAK")
+
+# NMEA sentences forwarded to bluetooth (None for all, e.g. {"GGA", "RMC"}) and
+# their maximum rate in Hz per talker
+NMEA_ALLOW = None
+NMEA_RATES = {"GSV": 1}
+
+# file to record RTCM latency traces to, None disables tracing
+TRACE_FILE = None
+
+# file to capture the raw receiver stream to for offline replay, None disables capturing
+CAPTURE_FILE = None
+
+
+def rtcm_handler(rtcm_stream, tracer=None):
     xbee_stream = None
     while True:
         try:
             xbee_stream = Serial("/dev/xbee", 115200, timeout=5)
+            reassembler = RTCMReassembler()
             while True:
-                byte = xbee_stream.read()
-                rtcm_stream.write(byte)
+                data = xbee_stream.read(max(xbee_stream.in_waiting, 1))
+                for frame in reassembler.feed(data):
+                    if tracer:
+                        tracer.stamp("reassembly", frame)
+                    rtcm_stream.write(frame)
 
         except StreamMuxDemuxError as e:
             log.error(e)
@@ -38,9 +58,11 @@ def nmea_handler(nmea_stream):
     while True:
         try:
             bluetooth_stream = Serial('/dev/rfcomm0', 115200, timeout=5)
+            nmea_filter = NMEAFilter(NMEA_ALLOW, NMEA_RATES)
             while True:
-                byte = nmea_stream.read()
-                bluetooth_stream.write(byte)
+                frame = nmea_stream.read_frame()
+                if frame is not None and nmea_filter.accept(frame):
+                    bluetooth_stream.write(frame.raw)
 
         except StreamMuxDemuxError as e:
             log.error(e)
@@ -54,20 +76,30 @@ def nmea_handler(nmea_stream):
             sleep(REPLUG_WAIT_TIME)
 
 
-def ubx_handler(ubx_stream):
+def log_message(frame, msg):
+    log.info(msg, extra={"msg_type": msg.identity})
+
+
+def log_frame(frame):
+    log.debug(frame, extra={"msg_type": frame.identity})
+
+
+def ubx_handler(ubx_stream, tracer=None):
+    dispatcher = UBXDispatcher(ubx_stream, default=log_frame)
+    for name in LOGGED_UBX:
+        dispatcher.subscribe(name, log_message)
+    if tracer:
+        dispatcher.subscribe("RXM-RTCM", tracer.stamp_rxm_rtcm)
+
     while True:
         try:
-            ubr = UBXReader(ubx_stream)
-            raw, msg = ubr.read()
-            log.info(msg)
+            dispatcher.run()
 
         except StreamMuxDemuxError as e:
             log.error(e)
             ubx_stream.owner.close()
             return
 
-        # TODO: except parse errors
-
         except Exception as e:
             log.error(e)
             # sleep(REPLUG_WAIT_TIME)
@@ -80,26 +112,36 @@ def main():
     TIMEOUT = 5
     log.info(f'Connecting to serial port {PORT}')
     original_stream = Serial(PORT, BAUDRATE, timeout=TIMEOUT)
+    if CAPTURE_FILE:
+        log.info(f'Capturing serial stream to {CAPTURE_FILE}')
+        original_stream = SerialCapture(original_stream, CAPTURE_FILE)
+
+    # record when corrections reach the receiver
+    tracer = CorrectionTracer(TRACE_FILE, "rover") if TRACE_FILE else None
+    on_write = (lambda data: tracer.stamp_data("injection", data)) if tracer else None
 
     # split serial stream into a stream for each protocol
     log.info(f'Splitting serial stream into a stream for each protocol')
-    streams = StreamMuxDemux(original_stream)
+    streams = StreamMuxDemux(original_stream, onWrite=on_write)
 
     # load configuration
     CONFIG_FILE = open("./config/rover.yml", "r")
     log.info(f'Loading configuration from {CONFIG_FILE}')
-    config = UBXSerializer.serialize(CONFIG_FILE)
-    streams.UBX.write(config)
-    # TODO: verify ubx answer
+    plan = UBXSerializer.plan(CONFIG_FILE)
+    failures = UBXConfigLoader(streams.UBX).apply(plan)
+    for failure in failures:
+        log.error(f'Configuration {failure.reason} after {failure.attempts} attempt(s): {failure.frame}')
+    if not failures:
+        log.info(f'Configuration acknowledged')
 
     # run UBX thread
     log.info(f'Creating a thread for handling UBX')
-    ubx_thread = Thread(target=ubx_handler, daemon=True, args=[streams.UBX])
+    ubx_thread = Thread(target=ubx_handler, daemon=True, args=[streams.UBX, tracer])
     ubx_thread.start()
 
     # run RTCM thread
     log.info(f'Creating a thread for handling RTCM')
-    rtcm_thread = Thread(target=rtcm_handler, daemon=True, args=[streams.RTCM])
+    rtcm_thread = Thread(target=rtcm_handler, daemon=True, args=[streams.RTCM, tracer])
     rtcm_thread.start()
 
     # run NMEA thread
@@ -113,10 +155,14 @@ def main():
     nmea_thread.join()
     streams.close()
     original_stream.close()
+    if tracer:
+        tracer.close()
 
 
 if __name__ == '__main__':
-    logging.basicConfig(format="%(levelname)s:%(name)s:%(asctime)s:  %(message)s", level=logging.DEBUG)
+    # log from a background thread, so slow output never stalls the handlers
+    LogPipeline(format="%(levelname)s:%(name)s:%(asctime)s:  %(message)s", level=logging.DEBUG,
+                burst=LOG_BURST).start()
 
     while True:
         try:
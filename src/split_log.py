@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+# Split a raw receiver dump or a CAPTURE_FILE into per-protocol files, and
+# query frames through a sidecar index:
+#   ./split_log.py rover.cap --index
+#   ./split_log.py rover.cap --query RTCM --identity 1230 --start 10 --end 20
+from ublox.Capture.LogSplitter import main
+
+
+if __name__ == '__main__':
+    main()
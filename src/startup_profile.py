@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# Cold start profile of the base/rover entry points: a -X importtime breakdown
+# of importing each entry point and the time to load its configuration with a
+# cold and a warm configuration cache, each in a fresh interpreter. The load is
+# what the entry points run: UBXSerializer.plan() and UBXConfigLoader.apply()
+# against a stub receiver that acknowledges everything. Results are
+# printed as JSON; with --budget the exit status is 1 if a start exceeds it:
+#   ./startup_profile.py --budget 0.5 --output startup.json
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+ENTRY_POINTS = {"base": "config/base.yml", "rover": "config/rover.yml"}
+
+CONFIG_PROBE = """
+import json, sys, time
+from threading import Condition
+from ublox import StreamMuxDemux, UBXSerializer, UBXConfigLoader
+from ublox.StreamMuxDemux.UBloxChecksum import ubx_checksum
+from ublox.StreamMuxDemux.UBloxFrameScanner import UBloxFrameScanner, UBX
+from ublox.UBXSerializer.UBXSerializer import KEY_SIZES
+
+def ubx(msg_class, msg_id, payload):
+    body = bytes([msg_class, msg_id]) + len(payload).to_bytes(2, "little") + payload
+    return b"\\xb5\\x62" + body + bytes(ubx_checksum(body))
+
+class Receiver:
+    # acknowledges every CFG message, VALGET polls are answered with all keys zero
+    timeout = 0.1
+    def __init__(self):
+        self._scanner = UBloxFrameScanner(protocols=(UBX,))
+        self._buffer = bytearray()
+        self._cv = Condition()
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+    def readinto(self, b):
+        with self._cv:
+            self._cv.wait_for(lambda: self._buffer, self.timeout)
+            n = min(len(b), len(self._buffer))
+            b[:n] = self._buffer[:n]
+            del self._buffer[:n]
+        return n
+    def write(self, data):
+        answers = b""
+        for protocol, frame in self._scanner.feed(bytes(data)):
+            if frame[3] == 0x8B:
+                keys = [frame[i:i + 4] for i in range(10, len(frame) - 2, 4)]
+                values = b"".join(key + bytes(KEY_SIZES[(key[3] >> 4) & 7]) for key in keys)
+                answers += ubx(0x06, 0x8B, bytes([1, frame[7], 0, 0]) + values)
+            answers += ubx(0x05, 0x01, frame[2:4])
+        with self._cv:
+            self._buffer += answers
+            self._cv.notify_all()
+        return len(data)
+    def close(self):
+        pass
+
+streams = StreamMuxDemux(Receiver())
+start = time.perf_counter()
+plan = UBXSerializer.plan(open(sys.argv[1]), cache_dir=sys.argv[2])
+planned = time.perf_counter()
+failures = UBXConfigLoader(streams.UBX).apply(plan)
+end = time.perf_counter()
+streams.close()
+print(json.dumps({"seconds": end - start, "plan": planned - start, "apply": end - planned,
+                  "failures": len(failures), "modules": sorted(sys.modules)}))
+"""
+
+def run(args):
+    return subprocess.run([sys.executable] + args, cwd=SRC, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr):
+    """ (module, self seconds, cumulative seconds, depth) of each -X importtime line """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    return imports
+
+
+def profile_imports(module, top):
+    imports = parse_importtime(run(["-X", "importtime", "-c", f"import {module}"]).stderr)
+    """ top level imports, the indented ones are included in their cumulative time """
+    total = sum(cumulative for name, self_time, cumulative, depth in imports if depth == 0)
+    return {
+        "seconds": total,
+        "modules": len(imports),
+        "by_cumulative": [
+            {"module": name, "cumulative": cumulative, "self": self_time}
+            for name, self_time, cumulative, depth in sorted(imports, key=lambda i: -i[2])[:top]
+        ],
+        "by_self": [
+            {"module": name, "self": self_time}
+            for name, self_time, cumulative, depth in sorted(imports, key=lambda i: -i[1])[:top]
+        ]
+    }
+
+
+def profile_config(config, cache_dir):
+    result = json.loads(run(["-c", CONFIG_PROBE, config, cache_dir]).stdout)
+    """ heavy dependencies the load pulled in, the package itself does not import them """
+    heavy = [name for name in ("yaml", "jsonschema", "pyubx2") if name in result["modules"]]
+    return {"seconds": result["seconds"], "plan": result["plan"], "apply": result["apply"],
+            "failures": result["failures"], "imported": heavy}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and configuration load profile of the entry points")
+    parser.add_argument("entry_points", nargs="*", default=list(ENTRY_POINTS), help="base and/or rover")
+    parser.add_argument("--top", type=int, default=15, help="number of modules listed per ranking")
+    parser.add_argument("--budget", type=float, help="seconds allowed for import plus warm configuration load")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+    for entry_point in args.entry_points:
+        if entry_point not in ENTRY_POINTS:
+            parser.error(f"unknown entry point {entry_point}, choose from {', '.join(ENTRY_POINTS)}")
+
+    report = {"python": sys.version.split()[0], "budget": args.budget, "entry_points": {}}
+    over_budget = False
+    for entry_point in args.entry_points:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold = profile_config(ENTRY_POINTS[entry_point], cache_dir)
+            warm = profile_config(ENTRY_POINTS[entry_point], cache_dir)
+        imports = profile_imports(entry_point, args.top)
+        startup = imports["seconds"] + warm["seconds"]
+        over_budget |= args.budget is not None and startup > args.budget
+        report["entry_points"][entry_point] = {
+            "startup_seconds": startup,
+            "imports": imports,
+            "config_cold": cold,
+            "config_warm": warm
+        }
+        print(f"{entry_point}: imports {imports['seconds'] * 1e3:.1f} ms, config cold {cold['seconds'] * 1e3:.1f} ms, "
+              f"warm {warm['seconds'] * 1e3:.1f} ms", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if over_budget:
+        print(f"startup exceeds the budget of {args.budget} s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+#!/usr/bin/env python3
+# Per-hop latency of RTCM corrections, from the TRACE_FILEs of base.py and rover.py:
+#   ./trace_report.py base-trace.jsonl rover-trace.jsonl
+from ublox.Tracing.CorrectionTracer import main
+
+
+if __name__ == '__main__':
+    main()
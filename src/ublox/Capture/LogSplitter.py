@@ -0,0 +1,321 @@
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+
+from ..StreamMuxDemux.UBloxFrameScanner import (UBloxFrameScanner, NMEA, UBX, RTCM,
+                                                UBX_PREAMBLE, RTCM_PREAMBLE, MAX_NMEA_LENGTH, MAX_UBX_LENGTH)
+from .SerialCapture import MAGIC, HEADER, RECORD
+
+PROTOCOL_CODES = {NMEA: 0, UBX: 1, RTCM: 2}
+PROTOCOLS = {code: protocol for protocol, code in PROTOCOL_CODES.items()}
+
+"""
+Sidecar index: a header with the magic and the size of the indexed log,
+followed by one entry per frame: stream offset, length, protocol, identity
+(UBX class << 8 | id, RTCM message number, 0 for NMEA) and the capture
+timestamp in seconds since the start of the capture (NaN for raw dumps).
+"""
+INDEX_MAGIC = b"UBXIDX1\n"
+INDEX_HEADER = struct.Struct("<8sQ")
+INDEX_ENTRY = struct.Struct("<QIBxHd")
+INDEX_TIMESTAMP = struct.Struct("<d")
+INDEX_TIMESTAMP_OFFSET = INDEX_ENTRY.size - INDEX_TIMESTAMP.size
+
+EXTENSIONS = {NMEA: ".nmea", UBX: ".ubx", RTCM: ".rtcm"}
+
+
+def _missing(carry, buf, pos, end):
+    """
+    Number of bytes of buf[pos:end] to append to carry, which starts with an
+    incomplete frame, to complete the frame or at least its header.
+    """
+    n = len(carry)
+    available = end - pos
+    if carry[0] == UBX_PREAMBLE[0]:
+        if n < 6:
+            needed = 6 - n
+        else:
+            length = carry[4] | (carry[5] << 8)
+            needed = 8 + length - n if length <= MAX_UBX_LENGTH else 1
+    elif carry[0] == RTCM_PREAMBLE:
+        needed = 3 - n if n < 3 else 6 + (((carry[1] & 0b11) << 8) | carry[2]) - n
+    else:
+        limit = min(end, pos + MAX_NMEA_LENGTH - n)
+        newline = buf.find(b"\n", pos, limit)
+        needed = newline + 1 - pos if newline >= 0 else limit - pos
+    return min(max(needed, 1), available)
+
+
+class LogFrame():
+    """ A frame of an offline log; data is a memoryview into the log whenever the frame is contiguous """
+
+    __slots__ = ('offset', 'protocol', 'data', 'timestamp')
+
+    def __init__(self, offset, protocol, data, timestamp):
+        self.offset = offset
+        self.protocol = protocol
+        self.data = data
+        self.timestamp = timestamp
+
+    @property
+    def identity(self):
+        data = self.data
+        if self.protocol == UBX:
+            return (data[2], data[3])
+        if self.protocol == RTCM:
+            return (data[3] << 4) | (data[4] >> 4) if len(data) >= 8 else None
+        end = bytes(data[:16]).find(b",")
+        return bytes(data[1:end if end > 0 else None]).decode("ascii", "replace")
+
+    def index_identity(self):
+        identity = self.identity
+        if self.protocol == UBX:
+            return (identity[0] << 8) | identity[1]
+        if self.protocol == RTCM:
+            return identity or 0
+        return 0
+
+
+class _IndexTimestamps:
+    """ Sequence of the timestamps of a mapped index, for bisect """
+
+    def __init__(self, index):
+        self._index = index
+
+    def __len__(self):
+        return (len(self._index) - INDEX_HEADER.size) // INDEX_ENTRY.size
+
+    def __getitem__(self, i):
+        return INDEX_TIMESTAMP.unpack_from(self._index, INDEX_HEADER.size + i * INDEX_ENTRY.size
+                                           + INDEX_TIMESTAMP_OFFSET)[0]
+
+
+class LogSplitter:
+    """
+    Splits a raw receiver dump or a SerialCapture file into NMEA, UBX and
+    RTCM3 frames, with the same framing and validation as the live demux.
+    The log is memory-mapped and walked with memoryview slices; only frames
+    that a capture record boundary splits are copied.
+
+    Offsets are positions in the receiver byte stream, which for a raw dump
+    are positions in the file.
+    """
+
+    def __init__(self, path, validate=True):
+        self._path = path
+        self._validate = validate
+        self._file = open(path, "rb")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size else b""
+        self._view = memoryview(self._mm)
+
+        """ (stream offset, file offset, length, timestamp) of each contiguous region """
+        self.is_capture = self._mm[:len(MAGIC)] == MAGIC
+        self._regions = self._capture_regions() if self.is_capture else [(0, 0, self._size, None)]
+        self._region_starts = [region[0] for region in self._regions]
+
+    def _capture_regions(self):
+        mm = self._mm
+        regions = []
+        stream_offset = 0
+        pos = HEADER.size
+        while pos + RECORD.size <= self._size:
+            t, length = RECORD.unpack_from(mm, pos)
+            pos += RECORD.size
+            if pos + length > self._size:
+                # truncated by a crash while capturing
+                break
+            regions.append((stream_offset, pos, length, t))
+            stream_offset += length
+            pos += length
+        return regions
+
+    def frames(self, protocols=(NMEA, UBX, RTCM)):
+        """ Iterate over the LogFrames of the given protocols, in stream order """
+        scanner = UBloxFrameScanner(validate=self._validate)
+        view = self._view
+        carry = bytearray()
+        carry_offset = 0
+
+        for stream_offset, file_offset, length, t in self._regions:
+            pos, end = file_offset, file_offset + length
+
+            """ frame split by a record boundary: copy just enough to complete it """
+            while carry and pos < end:
+                n = _missing(carry, self._mm, pos, end)
+                carry += view[pos:pos + n]
+                pos += n
+                consumed = 0
+                for protocol, start, stop in scanner.spans(carry, 0, len(carry)):
+                    consumed = stop
+                    if protocol in protocols:
+                        yield LogFrame(carry_offset + start, protocol, bytes(carry[start:stop]), t)
+                del carry[:consumed]
+                carry_offset += consumed
+
+            if carry:
+                continue
+
+            shift = stream_offset - file_offset
+            consumed = pos
+            for protocol, start, stop in scanner.spans(self._mm, pos, end):
+                consumed = stop
+                if protocol in protocols:
+                    yield LogFrame(shift + start, protocol, view[start:stop], t)
+
+            if consumed < end:
+                carry = bytearray(view[consumed:end])
+                carry_offset = shift + consumed
+
+    def read(self, offset, length):
+        """ length bytes at a stream offset; a memoryview if contiguous in the file """
+        i = bisect_right(self._region_starts, offset) - 1
+        stream_offset, file_offset, region_length, t = self._regions[i]
+        start = file_offset + offset - stream_offset
+        if offset + length <= stream_offset + region_length:
+            return self._view[start:start + length]
+
+        chunks = [self._view[start:file_offset + region_length]]
+        missing = length - len(chunks[0])
+        for stream_offset, file_offset, region_length, t in self._regions[i + 1:]:
+            n = min(missing, region_length)
+            chunks.append(self._view[file_offset:file_offset + n])
+            missing -= n
+            if not missing:
+                break
+        return b"".join(chunks)
+
+    def split(self, prefix=None):
+        """ Write the frames of each protocol to prefix.nmea, prefix.ubx and prefix.rtcm """
+        prefix = prefix or self._path
+        outputs = {protocol: open(prefix + extension, "wb") for protocol, extension in EXTENSIONS.items()}
+        try:
+            for frame in self.frames():
+                outputs[frame.protocol].write(frame.data)
+        finally:
+            for f in outputs.values():
+                f.close()
+
+    @property
+    def index_path(self):
+        return self._path + ".idx"
+
+    def build_index(self):
+        """ Write the sidecar index of all frames """
+        with open(self.index_path + ".tmp", "wb") as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self._size))
+            entries = []
+            for frame in self.frames():
+                timestamp = math.nan if frame.timestamp is None else frame.timestamp
+                entries.append(INDEX_ENTRY.pack(frame.offset, len(frame.data), PROTOCOL_CODES[frame.protocol],
+                                                frame.index_identity(), timestamp))
+                if len(entries) >= 4096:
+                    f.write(b"".join(entries))
+                    entries = []
+            f.write(b"".join(entries))
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def _index(self):
+        """ The index mapped into memory, rebuilt if missing or made for a different log size """
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, size = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic == INDEX_MAGIC and size == self._size:
+                    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, struct.error):
+            pass
+        self.build_index()
+        with open(self.index_path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def query(self, protocol=None, identity=None, start=None, end=None):
+        """
+        Frames matching a protocol, identity (e.g. 1230 for RTCM, (0x01, 0x07)
+        for UBX, 'GPGGA' for NMEA) and capture time range, read through the index.
+        Entries are in stream order and so sorted by timestamp, the time range
+        is looked up by binary search and only the entries within are unpacked.
+        """
+        code = None if protocol is None else PROTOCOL_CODES[protocol]
+        if isinstance(identity, tuple):
+            identity = (identity[0] << 8) | identity[1]
+
+        index = self._index()
+        try:
+            timestamps = _IndexTimestamps(index)
+            first, last = 0, len(timestamps)
+            if (start is not None or end is not None) and last and math.isnan(timestamps[0]):
+                # raw dumps have no timestamps
+                return
+            if start is not None:
+                first = bisect_left(timestamps, start)
+            if end is not None:
+                last = bisect_right(timestamps, end, first)
+
+            for i in range(first, last):
+                offset, length, entry_code, entry_identity, t = INDEX_ENTRY.unpack_from(
+                    index, INDEX_HEADER.size + i * INDEX_ENTRY.size)
+                if code is not None and entry_code != code:
+                    continue
+                if identity is not None and not isinstance(identity, str) and entry_identity != identity:
+                    continue
+                frame = LogFrame(offset, PROTOCOLS[entry_code], self.read(offset, length),
+                                 None if math.isnan(t) else t)
+                if isinstance(identity, str) and frame.identity != identity:
+                    continue
+                yield frame
+        finally:
+            index.close()
+
+    def close(self):
+        """
+        Frame data that is still referenced keeps the mapping alive, it is
+        then unmapped when the last of it is garbage collected.
+        """
+        self._view.release()
+        if self._size:
+            try:
+                self._mm.close()
+            except BufferError:
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a raw receiver log or capture into per-protocol files")
+    parser.add_argument("log", help="raw dump or SerialCapture file")
+    parser.add_argument("--prefix", help="output prefix, defaults to the log path")
+    parser.add_argument("--index", action="store_true", help="also build the sidecar index")
+    parser.add_argument("--query", choices=EXTENSIONS.keys(), help="print the frames of a protocol from the index")
+    parser.add_argument("--identity", help="message to query, e.g. 1230, 0x01,0x07 or GPGGA")
+    parser.add_argument("--start", type=float, help="query start, seconds since the start of the capture")
+    parser.add_argument("--end", type=float, help="query end, seconds since the start of the capture")
+    args = parser.parse_args()
+
+    with LogSplitter(args.log) as splitter:
+        if args.query:
+            identity = args.identity
+            if identity and "," in identity:
+                identity = tuple(int(part, 0) for part in identity.split(","))
+            elif identity and identity.isdigit():
+                identity = int(identity)
+            for frame in splitter.query(args.query, identity, args.start, args.end):
+                print(f"{frame.offset}\t{frame.timestamp}\t{frame.identity}\t{len(frame.data)}")
+            return
+
+        splitter.split(args.prefix)
+        if args.index:
+            splitter.build_index()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import struct
+from threading import Event
+from time import monotonic, time
+
+"""
+Capture file layout: a header with the magic and the wall clock and monotonic
+time the capture started, followed by one record per chunk read from the
+port: seconds since the start (float64), length (uint32), data.
+"""
+MAGIC = b"UBXCAP1\n"
+HEADER = struct.Struct("<8sdd")
+RECORD = struct.Struct("<dI")
+
+
+def read_header(f):
+    magic, wall_start, mono_start = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("not a capture file")
+    return wall_start, mono_start
+
+
+def read_records(path):
+    """ Iterate over the (seconds since start, data) records of a capture file """
+    with open(path, "rb") as f:
+        read_header(f)
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            t, length = RECORD.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                # truncated by a crash while capturing
+                return
+            yield t, data
+
+
+class SerialCapture:
+    """
+    Wraps a Serial and appends every chunk read from it, with its monotonic
+    timestamp, to a capture file. Everything else is passed through.
+    """
+
+    def __init__(self, serial, path):
+        self._serial = serial
+        self._file = open(path, "ab")
+        self._start = monotonic()
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, time(), self._start))
+        else:
+            # appending to an existing capture, possibly after a reboot: keep
+            # its time base by way of the wall clock
+            with open(path, "rb") as f:
+                wall_start, mono_start = read_header(f)
+            self._start = monotonic() - (time() - wall_start)
+
+    def _record(self, data):
+        if data:
+            self._file.write(RECORD.pack(monotonic() - self._start, len(data)))
+            self._file.write(data)
+
+    def read(self, size=1):
+        data = self._serial.read(size)
+        self._record(data)
+        return data
+
+    def readinto(self, b):
+        n = self._serial.readinto(b)
+        if n:
+            self._record(memoryview(b)[:n])
+        return n
+
+    def readline(self):
+        data = self._serial.readline()
+        self._record(data)
+        return data
+
+    def close(self):
+        self._file.close()
+        self._serial.close()
+
+    def __getattr__(self, name):
+        return getattr(self._serial, name)
+
+
+class SerialReplay:
+    """
+    Serial-shaped source replaying a capture file. speed 1 reproduces the
+    original timing, N replays N times faster and None as fast as possible.
+    Writes are discarded. After the last record reads time out like an idle
+    port; eof is set.
+    """
+
+    def __init__(self, path, speed=1, timeout=1):
+        self.timeout = timeout
+        self._speed = speed
+        self._records = read_records(path)
+        self._data = b""
+        self._pos = 0
+        self._due = None
+        self._start = None
+        self._closed = Event()
+
+        self.eof = False
+        self.bytes_written = 0
+
+    def _next_record(self):
+        """ Load the next record, returns False at the end of the capture """
+        try:
+            t, self._data = next(self._records)
+        except StopIteration:
+            self.eof = True
+            self._data = b""
+            return False
+        self._pos = 0
+        if self._start is None:
+            self._start = monotonic() - (t / self._speed if self._speed else 0)
+        self._due = self._start + t / self._speed if self._speed else 0
+        return True
+
+    def _wait(self):
+        """ Wait until the current record is due; returns the number of bytes available """
+        if self._pos >= len(self._data) and not self._next_record():
+            self._closed.wait(self.timeout)
+            return 0
+        delay = self._due - monotonic()
+        if delay > 0:
+            if self.timeout is not None and delay > self.timeout:
+                self._closed.wait(self.timeout)
+                return 0
+            self._closed.wait(delay)
+        return len(self._data) - self._pos
+
+    @property
+    def in_waiting(self):
+        if self._pos >= len(self._data) or self._due > monotonic():
+            return 0
+        return len(self._data) - self._pos
+
+    def readinto(self, b):
+        if self._closed.is_set():
+            return 0
+        available = self._wait()
+        n = min(len(b), available)
+        memoryview(b)[:n] = self._data[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def read(self, size=1):
+        result = bytearray()
+        while len(result) < size and not self._closed.is_set():
+            available = self._wait()
+            if not available:
+                break
+            n = min(size - len(result), available)
+            result += self._data[self._pos:self._pos + n]
+            self._pos += n
+        return bytes(result)
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+    def close(self):
+        self._closed.set()
@@ -0,0 +1,151 @@
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+
+QUEUE_SIZE = 1000
+
+
+class RateLimitedQueueHandler(QueueHandler):
+    """
+    Hands records over to a QueueListener without ever blocking the caller.
+    Records are not formatted here but in the listener thread, and they are
+    dropped (and counted) when the queue is full.
+
+    Records carrying a msg_type attribute (log.info(msg, extra={"msg_type": ...}))
+    are rate limited to burst records per interval and type. Suppressed
+    records are summarized as e.g. "NAV-STATUS x10 in last 1s".
+    """
+
+    def __init__(self, queue, interval=1.0, burst=1):
+        super().__init__(queue)
+        self._interval = interval
+        self._burst = burst
+
+        """ per message type: [start of interval, records seen, last record] """
+        self._windows = {}
+        self._windows_lock = Lock()
+
+        self.dropped = 0
+
+    def prepare(self, record):
+        # formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def _summary(self, msg_type, window, now):
+        start, count, last = window
+        record = logging.makeLogRecord(last.__dict__)
+        """ the records counted all fall within interval of start, however late the summary is emitted """
+        span = min(now - start, self._interval)
+        record.msg = f"{msg_type} x{count} in last {span:.3g}s"
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def emit(self, record):
+        msg_type = getattr(record, "msg_type", None)
+        if msg_type is None:
+            self.enqueue(self.prepare(record))
+            return
+
+        now = monotonic()
+        summary = None
+        with self._windows_lock:
+            window = self._windows.get(msg_type)
+            if window is None or now - window[0] >= self._interval:
+                if window is not None and window[1] > self._burst:
+                    summary = self._summary(msg_type, window, now)
+                window = self._windows[msg_type] = [now, 0, None]
+            window[1] += 1
+            window[2] = record
+            suppressed = window[1] > self._burst
+
+        if summary is not None:
+            self.enqueue(summary)
+        if not suppressed:
+            self.enqueue(self.prepare(record))
+
+    def flush_summaries(self, due_only=False):
+        """ Emit the summaries of all open intervals, with due_only only of those that have ended """
+        now = monotonic()
+        with self._windows_lock:
+            if due_only:
+                windows = {msg_type: window for msg_type, window in self._windows.items()
+                           if now - window[0] >= self._interval}
+                for msg_type in windows:
+                    del self._windows[msg_type]
+            else:
+                windows, self._windows = self._windows, {}
+        for msg_type, window in windows.items():
+            if window[1] > self._burst:
+                self.enqueue(self._summary(msg_type, window, now))
+
+
+class LogPipeline:
+    """
+    Routes all logging through a bounded queue drained by a background
+    thread, so slow stdout or journald never stalls the threads that log.
+    Summaries of rate limited records are emitted every interval by a
+    second thread, also when no further record of their type arrives.
+    """
+
+    def __init__(self, format=None, level=logging.INFO, queue_size=QUEUE_SIZE,
+                 interval=1.0, burst=1, handlers=None):
+        self._level = level
+        if handlers is None:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(format))
+            handlers = [handler]
+
+        queue = Queue(queue_size)
+        self.handler = RateLimitedQueueHandler(queue, interval, burst)
+        self._listener = QueueListener(queue, *handlers, respect_handler_level=True)
+        self._interval = interval
+        self._started = False
+        self._stopped = None
+        self._flusher_thread = None
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        root = logging.getLogger()
+        root.setLevel(self._level)
+        root.addHandler(self.handler)
+        self._listener.start()
+        self._stopped = Event()
+        self._flusher_thread = Thread(target=self._flush_summaries, args=(self._stopped,))
+        self._flusher_thread.daemon = True
+        self._flusher_thread.start()
+
+    def _flush_summaries(self, stopped):
+        while not stopped.wait(self._interval):
+            self.handler.flush_summaries(due_only=True)
+
+    def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        logging.getLogger().removeHandler(self.handler)
+        self._stopped.set()
+        self._flusher_thread.join()
+        self.handler.flush_summaries()
+        self._listener.stop()
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
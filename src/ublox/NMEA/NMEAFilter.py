@@ -0,0 +1,67 @@
+from ..StreamMuxDemux.UBloxChecksum import valid_nmea
+
+""" sentences sent as numbered groups, decimated as a whole """
+MULTIPART = {"GSV", "TXT"}
+
+""" tolerance in seconds for receiver and serial timing jitter when decimating """
+RATE_TOLERANCE = 0.02
+
+
+class NMEAFilter:
+    """
+    Decides which NMEA sentences are forwarded.
+
+    allow is a set of sentence types ("GGA") or full addresses ("GPGSV");
+    None allows everything. rates maps a sentence type or a full address to
+    the maximum number of sentences (groups for GSV/TXT) per second and is
+    tracked per talker, so "GSV": 1 forwards one GPGSV and one GLGSV group per
+    second. A full address takes precedence over the sentence type.
+    """
+
+    def __init__(self, allow=None, rates=None, check=True):
+        self._allow = set(allow) if allow is not None else None
+        self._rates = dict(rates or {})
+        self._check = check
+
+        """ per address: time of the last accepted sentence and decision for the current group """
+        self._last = {}
+        self._group = {}
+
+        self.accepted = 0
+        self.rejected = 0
+
+    def _allowed(self, address, sentence):
+        return self._allow is None or address in self._allow or sentence in self._allow
+
+    def _due(self, address, sentence, now, fields):
+        rate = self._rates.get(address, self._rates.get(sentence))
+        if not rate:
+            return True
+
+        if sentence in MULTIPART and len(fields) > 2 and fields[2] not in (b"", b"1"):
+            """ not the first part, follow the decision made for the group """
+            return self._group.get(address, False)
+
+        last = self._last.get(address)
+        due = last is None or now - last >= 1 / rate - RATE_TOLERANCE
+        if due:
+            self._last[address] = now
+        self._group[address] = due
+        return due
+
+    def accept(self, frame):
+        """ True if the sentence in the UBloxFrame should be forwarded """
+        raw = frame.raw
+        address = frame.identity
+        sentence = address[2:]
+
+        ok = (not self._check or valid_nmea(raw)) and self._allowed(address, sentence)
+        if ok:
+            star = raw.rfind(b"*")
+            ok = self._due(address, sentence, frame.received_at, raw[:star].split(b",", 3))
+
+        if ok:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+        return ok
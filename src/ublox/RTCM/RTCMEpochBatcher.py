@@ -0,0 +1,88 @@
+""" size of the RTCM3 frame header preceding the payload """
+HEADER_SIZE = 3
+
+""" longest batch handed out at once, and longest time an epoch may stay open """
+MAX_BATCH_SIZE = 4096
+MAX_EPOCH_DELAY = 0.5
+
+
+def is_msm(msg_type):
+    """ MSM1-7 of GPS, GLONASS, Galileo, SBAS, QZSS and BeiDou (1071-1137) """
+    return msg_type is not None and 1071 <= msg_type <= 1137 and 1 <= msg_type % 10 <= 7
+
+
+def multiple_message_bit(raw):
+    """
+    MSM header: message number (12 bits), station id (12), epoch time (30),
+    multiple message bit (1). The bit is set on all but the last MSM of an epoch.
+    """
+    return (raw[HEADER_SIZE + 6] >> 1) & 1
+
+
+class RTCMEpochBatcher:
+    """
+    Groups the RTCM frames of one epoch so they can be handed to the transport
+    in a single write as soon as the epoch is complete.
+
+    An epoch is opened by an MSM with the multiple message bit set and closed
+    by the first MSM without it. Frames arriving while no epoch is open (e.g.
+    1005 or 1230 between epochs) are passed through immediately. A batch is
+    also flushed once it would exceed max_size or has been open for longer
+    than max_delay. The delay is only checked when add() or flush_if_due()
+    is called, so call flush_if_due() at least every due_in() seconds, also
+    when no frame arrives, or a lost final MSM holds corrections back.
+    """
+
+    def __init__(self, max_size=MAX_BATCH_SIZE, max_delay=MAX_EPOCH_DELAY):
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._batch = []
+        self._size = 0
+        self._opened_at = None
+
+    def add(self, frame):
+        """ Add a UBloxFrame, returns the list of byte strings ready to be written """
+        ready = []
+        raw = frame.raw
+
+        if self._batch and (self._size + len(raw) > self._max_size or
+                            frame.received_at - self._opened_at > self._max_delay):
+            ready.append(self.flush())
+
+        msm = is_msm(frame.msg_type)
+        more = msm and multiple_message_bit(raw)
+
+        if not self._batch and not more:
+            """ no epoch open and none starting """
+            ready.append(raw)
+            return ready
+
+        if not self._batch:
+            self._opened_at = frame.received_at
+        self._batch.append(raw)
+        self._size += len(raw)
+
+        if msm and not more:
+            # last MSM of the epoch
+            ready.append(self.flush())
+        return ready
+
+    def due_in(self, now):
+        """ Seconds until the open batch has to be flushed, None if none is open """
+        if not self._batch:
+            return None
+        return max(self._opened_at + self._max_delay - now, 0)
+
+    def flush_if_due(self, now):
+        """ The open batch if it has been open for max_delay, as a list like add() """
+        if self._batch and now - self._opened_at >= self._max_delay:
+            return [self.flush()]
+        return []
+
+    def flush(self):
+        """ Everything batched so far as a single byte string """
+        data = b"".join(self._batch)
+        self._batch = []
+        self._size = 0
+        self._opened_at = None
+        return data
@@ -0,0 +1,28 @@
+from ..StreamMuxDemux.UBloxFrameScanner import UBloxFrameScanner, RTCM, RTCM_PREAMBLE
+
+
+class RTCMReassembler:
+    """
+    Reassembles RTCM3 frames from an unreliable byte stream such as a radio
+    link. Only complete frames with a valid CRC-24Q are handed out; anything
+    else is counted and dropped.
+    """
+
+    def __init__(self):
+        self._scanner = UBloxFrameScanner(self._discard, protocols=(RTCM,))
+
+        self.frames = 0
+        self.discarded_frames = 0
+        self.discarded_bytes = 0
+
+    def _discard(self, data):
+        self.discarded_bytes += len(data)
+        if data[0] == RTCM_PREAMBLE:
+            # truncated or corrupted frame
+            self.discarded_frames += 1
+
+    def feed(self, data):
+        """ Add received bytes, returns the list of complete frames """
+        frames = [frame for protocol, frame in self._scanner.feed(data)]
+        self.frames += len(frames)
+        return frames
@@ -0,0 +1,254 @@
+import asyncio
+import os
+from collections import deque
+from time import monotonic
+
+from .StreamMuxDemuxError import StreamMuxDemuxError
+from .UBloxFrameScanner import UBloxFrameScanner, NMEA, UBX, RTCM
+from .UBloxFrame import UBloxFrame
+from .UBloxQueue import DEFAULT_LIMITS, OverflowPolicy
+
+
+class AsyncUBloxStream():
+    """
+    Per-protocol stream of an AsyncStreamMuxDemux. UBloxFrames are read with
+    `await stream.read_frame()` or `async for frame in stream`.
+    """
+
+    def __init__(self, owner, ttl, limits, write_func):
+        self._owner = owner
+        self._loop = owner._loop
+        self._max_ttl = ttl
+        self._write = write_func
+
+        self._frames = deque()
+        self._bytes = 0
+        self._waiters = deque()
+
+        self._max_frames = limits.max_frames
+        self._max_bytes = limits.max_bytes
+        self._policy = limits.policy
+
+        """ number of frames discarded by the overflow policy and by the ttl """
+        self.dropped = 0
+        self.expired = 0
+
+    def _discard_old_items(self, now):
+        frames = self._frames
+        while frames and frames[0][1] <= now:
+            self._bytes -= len(frames.popleft()[0])
+            self.expired += 1
+
+    def _is_full(self, size=0):
+        if not self._frames:
+            return False
+        if self._max_frames is not None and len(self._frames) >= self._max_frames:
+            return True
+        return self._max_bytes is not None and self._bytes + size > self._max_bytes
+
+    def _put(self, frame):
+        now = self._loop.time()
+        size = len(frame)
+        self._discard_old_items(now)
+
+        if self._is_full(size):
+            if self._policy == OverflowPolicy.DROP_NEWEST:
+                self.dropped += 1
+                return
+
+            if self._policy == OverflowPolicy.DROP_OLDEST:
+                while self._is_full(size):
+                    self._bytes -= len(self._frames.popleft()[0])
+                    self.dropped += 1
+
+            else:
+                # the reader callback cannot block, stop reading the port instead
+                self._owner._pause()
+
+        self._frames.append((frame, now + self._max_ttl))
+        self._bytes += size
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def _wake_all(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def read_frame(self):
+        while True:
+            self._discard_old_items(self._loop.time())
+            if self._frames:
+                frame, expires_at = self._frames.popleft()
+                self._bytes -= len(frame)
+                if not self._is_full():
+                    self._owner._resume()
+                return frame
+
+            self._owner._validate()
+
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.read_frame()
+        except StreamMuxDemuxError:
+            raise StopAsyncIteration
+
+    async def write(self, data):
+        await self._write(data)
+
+    @property
+    def in_waiting(self):
+        return self._bytes
+
+    @property
+    def owner(self):
+        return self._owner
+
+
+class AsyncStreamMuxDemux:
+    """
+    asyncio flavour of StreamMuxDemux. The serial port's file descriptor is
+    watched by the running event loop, so no threads are involved. Must be
+    created from within a coroutine.
+
+    OverflowPolicy.BLOCK cannot block the event loop; a full BLOCK stream
+    stops reading from the port until its consumer catches up.
+    """
+
+    def __init__(self, serial, ttl=1, chunk_size=4096,
+                 nmea_limits=DEFAULT_LIMITS, ubx_limits=DEFAULT_LIMITS, rtcm_limits=DEFAULT_LIMITS,
+                 onError=None):
+        self._serial = serial
+        self._fd = serial.fileno()
+        self._loop = asyncio.get_running_loop()
+        os.set_blocking(self._fd, False)
+
+        self._chunk = bytearray(chunk_size)
+        self._scanner = UBloxFrameScanner(onError)
+        self._write_lock = asyncio.Lock()
+
+        self._nmea = AsyncUBloxStream(self, ttl, nmea_limits, self._write)
+        self._ubx = AsyncUBloxStream(self, ttl, ubx_limits, self._write)
+        self._rtcm = AsyncUBloxStream(self, ttl, rtcm_limits, self._write)
+        self._streams = {NMEA: self._nmea, UBX: self._ubx, RTCM: self._rtcm}
+
+        self._error = None
+        self._closed = False
+        self._paused = False
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    def _validate(self):
+        if self._error:
+            raise StreamMuxDemuxError(self._error)
+        if self._closed:
+            raise StreamMuxDemuxError("Use of a closed AsyncStreamMuxDemux")
+
+    def _on_readable(self):
+        try:
+            n = os.readv(self._fd, [self._chunk])
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self._fail(e)
+            return
+
+        if not n:
+            self._fail(EOFError("serial port closed"))
+            return
+
+        received_at = monotonic()
+        for protocol, msg in self._scanner.feed(self._chunk, n):
+            self._streams[protocol]._put(UBloxFrame(protocol, msg, received_at))
+
+    def _fail(self, error):
+        self._error = error
+        self.close()
+
+    def _pause(self):
+        if not self._paused and not self._closed:
+            self._paused = True
+            self._loop.remove_reader(self._fd)
+
+    def _resume(self):
+        if not self._paused or self._closed:
+            return
+        if any(stream._is_full() for stream in self._streams.values()):
+            return
+        self._paused = False
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    async def _write(self, data):
+        self._validate()
+        view = memoryview(data)
+
+        """ one write at a time, so frames are never interleaved """
+        async with self._write_lock:
+            while view:
+                try:
+                    n = os.write(self._fd, view)
+                    view = view[n:]
+                    continue
+                except (BlockingIOError, InterruptedError):
+                    pass
+
+                writable = self._loop.create_future()
+                self._loop.add_writer(self._fd, writable.set_result, None)
+                try:
+                    await writable
+                finally:
+                    self._loop.remove_writer(self._fd)
+
+    async def write(self, data):
+        await self._write(data)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if not self._paused:
+            self._loop.remove_reader(self._fd)
+        for stream in self._streams.values():
+            stream._wake_all()
+
+    def is_closed(self):
+        return self._closed
+
+    def dropped(self):
+        return {protocol: stream.dropped for protocol, stream in self._streams.items()}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    @property
+    def UBX(self):
+        self._validate()
+        return self._ubx
+
+    @property
+    def NMEA(self):
+        self._validate()
+        return self._nmea
+
+    @property
+    def RTCM(self):
+        self._validate()
+        return self._rtcm
@@ -1,15 +1,25 @@
 from .UBloxReaderDEMUX import UBloxReaderDEMUX
-from .UBloxWriterMUX import UBloxWriterMUX
+from .UBloxWriterMUX import UBloxWriterMUX, MAX_WRITE_SIZE
 from .UBloxStream import UBloxStream
+from .UBloxQueue import DEFAULT_LIMITS
+from .UBloxFrameScanner import NMEA, UBX, RTCM
+from .UBloxMetrics import MetricsServer
 
 
 class StreamMuxDemux:
-    def __init__(self, serial, ttl=1):
-        self._readerDEMUX = UBloxReaderDEMUX(serial, ttl, serial.timeout)
-        self._writerMUX = UBloxWriterMUX(serial)
-        self._nmea = UBloxStream(self._readerDEMUX.readNMEA, self._writerMUX.writeNMEA, self)
-        self._ubx = UBloxStream(self._readerDEMUX.readUBX, self._writerMUX.writeUBX, self)
-        self._rtcm = UBloxStream(self._readerDEMUX.readRTCM, self._writerMUX.writeRTCM, self)
+    def __init__(self, serial, ttl=1, chunk_size=4096,
+                 nmea_limits=DEFAULT_LIMITS, ubx_limits=DEFAULT_LIMITS, rtcm_limits=DEFAULT_LIMITS,
+                 max_write_size=MAX_WRITE_SIZE, onWrite=None):
+        self._readerDEMUX = UBloxReaderDEMUX(serial, ttl, serial.timeout, chunk_size=chunk_size,
+                                             nmea_limits=nmea_limits, ubx_limits=ubx_limits,
+                                             rtcm_limits=rtcm_limits)
+        self._writerMUX = UBloxWriterMUX(serial, max_write_size, onWrite)
+        self._nmea = UBloxStream(self._readerDEMUX.readNMEA, self._writerMUX.writeNMEA, self,
+                                 self._readerDEMUX.waitingNMEA)
+        self._ubx = UBloxStream(self._readerDEMUX.readUBX, self._writerMUX.writeUBX, self,
+                                self._readerDEMUX.waitingUBX)
+        self._rtcm = UBloxStream(self._readerDEMUX.readRTCM, self._writerMUX.writeRTCM, self,
+                                 self._readerDEMUX.waitingRTCM)
         self._closed = False
 
     def _validate(self):
@@ -25,6 +35,37 @@ class StreamMuxDemux:
 
     def is_closed(self):
         return self._closed
+
+    def subscribe(self, protocol, limits=DEFAULT_LIMITS):
+        """
+        Additional stream that receives every NMEA, UBX or RTCM frame,
+        independently of the default stream and of other subscribers. All
+        subscribers share the same immutable frame objects. Close the
+        returned stream to unsubscribe.
+        """
+        self._validate()
+        q = self._readerDEMUX.subscribe(protocol, limits)
+        write = {
+            NMEA: self._writerMUX.writeNMEA,
+            UBX: self._writerMUX.writeUBX,
+            RTCM: self._writerMUX.writeRTCM
+        }[protocol]
+        return UBloxStream(q.get, write, self, lambda: q.nbytes,
+                           lambda: self._readerDEMUX.unsubscribe(q))
+
+    def dropped(self):
+        return self._readerDEMUX.dropped()
+
+    def metrics(self):
+        """ Snapshot of the reader, queue and writer counters """
+        return {
+            "reader": self._readerDEMUX.metrics(),
+            "writer": self._writerMUX.metrics()
+        }
+
+    def serve_metrics(self, port=9108, host="127.0.0.1"):
+        """ Expose metrics() over HTTP on /metrics (text) and /metrics.json """
+        return MetricsServer(self.metrics, port, host)
         
     @property
     def UBX(self):
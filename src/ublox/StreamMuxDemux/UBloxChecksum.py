@@ -0,0 +1,59 @@
+from functools import reduce
+from itertools import accumulate
+from operator import xor
+
+CRC24Q_POLY = 0x1864CFB
+
+
+def _crc24q_table():
+    table = []
+    for i in range(256):
+        crc = i << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= CRC24Q_POLY
+        table.append(crc & 0xFFFFFF)
+    return tuple(table)
+
+
+CRC24Q_TABLE = _crc24q_table()
+
+
+def ubx_checksum(data):
+    """ 8-bit Fletcher checksum (CK_A, CK_B) over UBX class, id, length and payload """
+    return sum(data) & 0xFF, sum(accumulate(data)) & 0xFF
+
+
+def crc24q(data, crc=0):
+    """ CRC-24Q as used by RTCM3, computed over header and payload """
+    table = CRC24Q_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ byte]
+    return crc
+
+
+def nmea_checksum(data):
+    """ XOR of all characters between '$' and '*' """
+    return reduce(xor, data, 0)
+
+
+def valid_ubx(frame):
+    ck_a, ck_b = ubx_checksum(frame[2:-2])
+    return frame[-2] == ck_a and frame[-1] == ck_b
+
+
+def valid_rtcm(frame):
+    """ the CRC over the whole frame including the parity is zero """
+    return crc24q(frame) == 0
+
+
+def valid_nmea(sentence):
+    star = sentence.rfind(b"*")
+    if star < 0:
+        return False
+    try:
+        expected = int(sentence[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+    return nmea_checksum(sentence[1:star]) == expected
@@ -0,0 +1,63 @@
+from .UBloxFrameScanner import UBX, RTCM
+
+
+class UBloxFrame():
+    """
+    A single NMEA, UBX or RTCM3 frame as delimited by the demux. raw holds the
+    complete frame including preamble and checksum, received_at is the
+    monotonic time the chunk containing the end of the frame was read.
+    Header fields are decoded on access, so routing on them costs no parsing.
+    """
+
+    __slots__ = ('protocol', 'raw', 'received_at')
+
+    def __init__(self, protocol, raw, received_at):
+        self.protocol = protocol
+        self.raw = raw
+        self.received_at = received_at
+
+    @property
+    def msg_class(self):
+        """ UBX class """
+        return self.raw[2] if self.protocol == UBX else None
+
+    @property
+    def msg_id(self):
+        """ UBX message id """
+        return self.raw[3] if self.protocol == UBX else None
+
+    @property
+    def msg_type(self):
+        """ RTCM3 message number """
+        if self.protocol != RTCM or len(self.raw) < 8:
+            return None
+        return (self.raw[3] << 4) | (self.raw[4] >> 4)
+
+    @property
+    def identity(self):
+        """ (class, id) for UBX, message number for RTCM, address field (e.g. 'GPGGA') for NMEA """
+        if self.protocol == UBX:
+            return (self.raw[2], self.raw[3])
+        if self.protocol == RTCM:
+            return self.msg_type
+        end = self.raw.find(b",")
+        return self.raw[1:end if end > 0 else None].decode("ascii", "replace")
+
+    @property
+    def payload(self):
+        """ memoryview of the payload without header and checksum """
+        if self.protocol == UBX:
+            return memoryview(self.raw)[6:-2]
+        if self.protocol == RTCM:
+            return memoryview(self.raw)[3:-3]
+        star = self.raw.rfind(b"*")
+        return memoryview(self.raw)[1:star if star > 0 else None]
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __bytes__(self):
+        return self.raw
+
+    def __repr__(self):
+        return f"UBloxFrame({self.protocol}, {self.identity!r}, {len(self.raw)} bytes)"
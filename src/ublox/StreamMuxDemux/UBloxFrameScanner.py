@@ -0,0 +1,175 @@
+from .UBloxChecksum import valid_nmea, valid_ubx, valid_rtcm
+
+NMEA = "NMEA"
+UBX = "UBX"
+RTCM = "RTCM"
+
+NMEA_PREAMBLE = 0x24                # $
+UBX_PREAMBLE = (0xB5, 0x62)
+RTCM_PREAMBLE = 0xD3
+
+PREAMBLES = {NMEA: b"$", UBX: b"\xb5", RTCM: b"\xd3"}
+
+""" longest NMEA sentence we wait for before declaring the '$' garbage """
+MAX_NMEA_LENGTH = 256
+
+""" longest UBX payload we wait for (RXM-RAWX with all channels stays well below) before resyncing """
+MAX_UBX_LENGTH = 8192
+
+
+class UBloxFrameScanner:
+    """
+    Cuts NMEA, UBX and RTCM3 frames out of a byte stream.
+
+    Data is handed over in chunks of arbitrary size. Complete frames are
+    returned as (protocol, frame) tuples, partial frames at the end of a chunk
+    are carried over to the next one. Bytes that do not belong to any frame
+    are passed to onError.
+
+    With validate enabled, frames with a bad checksum are treated like any
+    other garbage: scanning resumes at the byte after the bad preamble rather
+    than trusting a possibly corrupted length field. protocols limits the
+    scanner to a subset of NMEA, UBX and RTCM; everything else is garbage.
+    """
+
+    def __init__(self, onError=None, validate=True, protocols=(NMEA, UBX, RTCM)):
+        self._onError = onError
+        self._validate = validate
+        self._preambles = tuple(PREAMBLES[protocol] for protocol in protocols)
+        self._starts = frozenset(preamble[0] for preamble in self._preambles)
+        self._carry = bytearray()
+
+    def feed(self, data, end=None):
+        """ Scan data[:end] (bytes or bytearray) for frames """
+        if end is None:
+            end = len(data)
+
+        if self._carry:
+            self._carry += memoryview(data)[:end]
+            buf, end = self._carry, len(self._carry)
+        else:
+            buf = data
+
+        frames = []
+        pos = self.scan(buf, 0, end, frames)
+
+        if buf is self._carry:
+            del self._carry[:pos]
+        elif pos < end:
+            self._carry = bytearray(memoryview(buf)[pos:end])
+        return frames
+
+    def scan(self, buf, pos, end, frames):
+        """
+        Append all complete frames in buf[pos:end] to frames and return the
+        position of the first byte that has not been consumed yet.
+        """
+        with memoryview(buf) as view:
+            for protocol, start, stop in self.spans(buf, pos, end):
+                if protocol is not None:
+                    frames.append((protocol, bytes(view[start:stop])))
+                elif self._onError:
+                    self._onError(bytes(view[start:stop]))
+                pos = stop
+        return pos
+
+    def spans(self, buf, pos, end):
+        """
+        Iterate over the (protocol, start, stop) spans of the frames in
+        buf[pos:end]; protocol is None for garbage. Stops before an
+        incomplete frame at the end. buf needs to support indexing and
+        find(), e.g. bytes, bytearray or mmap.
+        """
+        starts = self._starts
+        while pos < end:
+            if buf[pos] in starts:
+                stop = frame_end(buf, pos, end, self._validate)
+            else:
+                stop = 0
+
+            if stop > 0:
+                yield protocol_of(buf[pos]), pos, stop
+                pos = stop
+                continue
+
+            if stop < 0:
+                # incomplete, wait for more data
+                return
+
+            """ not a frame, skip to the next preamble candidate """
+            skip_to = find_preamble(buf, pos + 1, end, self._preambles)
+            yield None, pos, skip_to
+            pos = skip_to
+
+
+def protocol_of(preamble):
+    if preamble == NMEA_PREAMBLE:
+        return NMEA
+    if preamble == UBX_PREAMBLE[0]:
+        return UBX
+    return RTCM
+
+
+def find_preamble(buf, pos, end, preambles=tuple(PREAMBLES.values())):
+    """ Position of the first byte in buf[pos:end] that may start a frame """
+    result = end
+    for preamble in preambles:
+        i = buf.find(preamble, pos, result)
+        if i >= 0:
+            result = i
+    return result
+
+
+def frame_end(buf, pos, end, validate=True):
+    """
+    Examine the frame starting at buf[pos]. Returns the position just past
+    the frame if it is complete, -1 if more data is needed and 0 if buf[pos]
+    does not start a (valid) frame.
+    """
+    preamble = buf[pos]
+
+    """ NMEA """
+    if preamble == NMEA_PREAMBLE:
+        limit = min(end, pos + MAX_NMEA_LENGTH)
+        stop = buf.find(b"\n", pos, limit)
+        if stop >= 0:
+            if validate and not valid_nmea(buf[pos:stop]):
+                return 0
+            return stop + 1
+        return -1 if limit == end and limit - pos < MAX_NMEA_LENGTH else 0
+
+    """ UBX """
+    if preamble == UBX_PREAMBLE[0]:
+        if pos + 1 >= end:
+            return -1
+        if buf[pos + 1] != UBX_PREAMBLE[1]:
+            return 0
+        if pos + 6 > end:
+            return -1
+        length = buf[pos + 4] | (buf[pos + 5] << 8)
+        if length > MAX_UBX_LENGTH:
+            # corrupted length, don't hold back everything behind it
+            return 0
+        stop = pos + 8 + length                     # header, payload, CK_A, CK_B
+        if stop > end:
+            return -1
+        if validate and not valid_ubx(buf[pos:stop]):
+            return 0
+        return stop
+
+    """ RTCM """
+    if preamble == RTCM_PREAMBLE:
+        if pos + 3 > end:
+            return -1
+        if validate and buf[pos + 1] & 0b11111100:
+            # reserved bits must be zero
+            return 0
+        length = ((buf[pos + 1] & 0b00000011) << 8) + buf[pos + 2]
+        stop = pos + 3 + length + 3                 # header, payload, parity
+        if stop > end:
+            return -1
+        if validate and not valid_rtcm(buf[pos:stop]):
+            return 0
+        return stop
+
+    return 0
@@ -0,0 +1,131 @@
+import json
+from bisect import bisect_left
+from threading import Thread
+
+from .UBloxFrameScanner import NMEA, UBX, RTCM
+
+""" upper bounds of the latency histogram buckets, in seconds """
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5)
+
+
+class Histogram():
+    """
+    Fixed-bucket histogram. observe() is a bisect and two additions, cheap
+    enough to run for every frame.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._bounds = tuple(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, p):
+        """ Upper bound of the bucket containing the p-th percentile (0-100) """
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(self._bounds, self._counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self._bounds + (float("inf"),), self._counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "buckets": buckets
+        }
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+def to_text(snapshot, prefix="ublox"):
+    """
+    Render a metrics snapshot in the Prometheus text format. Protocol names
+    become a protocol label, histogram buckets an le label.
+    """
+    lines = []
+
+    def walk(node, name, labels):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in (NMEA, UBX, RTCM):
+                    walk(value, name, labels + [f'protocol="{key}"'])
+                elif key == "buckets":
+                    for bound, count in value.items():
+                        le = f'le="{_format_value(float(bound))}"'
+                        walk(count, f"{name}_bucket", labels + [le])
+                else:
+                    walk(value, f"{name}_{key}", labels)
+            return
+        label_text = "{" + ",".join(labels) + "}" if labels else ""
+        lines.append(f"{name}{label_text} {_format_value(node)}")
+
+    walk(snapshot, prefix, [])
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves the snapshot returned by source() over HTTP, as text on /metrics
+    and as JSON on /metrics.json. Binds to localhost by default.
+    """
+
+    def __init__(self, source, port=9108, host="127.0.0.1"):
+        # only loaded when metrics are served
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = to_text(source()).encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(source(), default=str).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
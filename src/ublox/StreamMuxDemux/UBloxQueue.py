@@ -1,65 +1,215 @@
-import time
-from queue import Queue
-from threading import Thread
+from collections import deque, namedtuple
+from enum import Enum, unique
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep
+from weakref import WeakSet
 
 from .StreamMuxDemuxError import StreamMuxDemuxError
+from .UBloxMetrics import Histogram
+
+MIN_HOUSEKEEPING_INTERVAL = 0.1
+
+
+class _Housekeeper():
+    """
+    Single thread per process that reaps expired items from idle queues.
+    Busy queues expire their items lazily in put() and get(), this only
+    bounds how long stale items stay in memory when nobody touches a queue.
+    """
+
+    def __init__(self):
+        self._queues = WeakSet()
+        self._lock = Lock()
+        self._thread = None
+
+    def register(self, q):
+        with self._lock:
+            self._queues.add(q)
+            if self._thread is None:
+                self._thread = Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unregister(self, q):
+        with self._lock:
+            self._queues.discard(q)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                queues = list(self._queues)
+                if not queues:
+                    self._thread = None
+                    return
+
+            interval = max(min(q._max_ttl for q in queues), MIN_HOUSEKEEPING_INTERVAL)
+            for q in queues:
+                q.purge()
+
+            # do not keep the queues alive while sleeping
+            del queues
+            sleep(interval)
+
+
+_housekeeper = _Housekeeper()
+
+
+@unique
+class OverflowPolicy(Enum):
+    DROP_OLDEST = 0     # make room by discarding the oldest frames
+    DROP_NEWEST = 1     # discard the frame being added
+    BLOCK       = 2     # block the producer until there is room
+
+
+QueueLimits = namedtuple('QueueLimits', 'max_frames max_bytes policy')
+
+DEFAULT_LIMITS = QueueLimits(max_frames=1024, max_bytes=1024 * 1024, policy=OverflowPolicy.DROP_OLDEST)
+
 
 class UBloxQueue():
-    def __init__(self, ttl, timeout):
-        self._q = Queue()
+    def __init__(self, ttl, timeout, limits=DEFAULT_LIMITS):
+        self._q = deque()
+        self._bytes = 0
+        lock = Lock()
+        self._not_empty = Condition(lock)
+        self._not_full = Condition(lock)
         self._max_ttl = ttl
         self._timeout = timeout
 
+        self._max_frames = limits.max_frames
+        self._max_bytes = limits.max_bytes
+        self._policy = limits.policy
+
+        """ number of frames discarded by the overflow policy and by the ttl """
+        self.dropped = 0
+        self.expired = 0
+
+        """ time from serial arrival to dequeue of UBloxFrames """
+        self.latency = Histogram()
+
         self._closed = False
-        self._watcher_thread = Thread(target=self._watch_old_items)
-        self._watcher_thread.daemon = True
-        self._watcher_thread.start()
-    
+        _housekeeper.register(self)
+
     def _validate(self):
         if self._closed:
             raise StreamMuxDemuxError("Use of a closed UBloxQueue")
 
-    def _watch_old_items(self):
-        self._validate()
-        while not self._closed:
-            ttl = self._discard_old_items()
-            time.sleep(ttl)
+    def _discard_old_items(self, now):
+        """ must be called with the lock held """
+        q = self._q
+        expired = 0
+        while q and q[0][1] <= now:
+            self._bytes -= len(q.popleft()[0])
+            expired += 1
+        if expired:
+            self.expired += expired
+            self._not_full.notify_all()
 
-    def _discard_old_items(self):
-        self._validate()
-        now = time.time()
-        while self._q.qsize() > 0:
-            item, expires_at = self._q.queue[-1]
-            if expires_at <= now:
-                self._q.get()
-            else:
-                ttl = expires_at - now
-                return ttl
-        return self._max_ttl
+    def _is_full(self, size):
+        """ must be called with the lock held; an empty queue always accepts one item """
+        if not self._q:
+            return False
+        if self._max_frames is not None and len(self._q) >= self._max_frames:
+            return True
+        return self._max_bytes is not None and self._bytes + size > self._max_bytes
+
+    def _make_room(self, size, now):
+        """ must be called with the lock held; returns False if the item should be dropped """
+        if not self._is_full(size):
+            return True
+
+        if self._policy == OverflowPolicy.DROP_NEWEST:
+            return False
+
+        if self._policy == OverflowPolicy.DROP_OLDEST:
+            while self._is_full(size):
+                self._bytes -= len(self._q.popleft()[0])
+                self.dropped += 1
+            return True
+
+        """ block until a consumer or the ttl makes room """
+        while self._is_full(size):
+            if self._closed:
+                return False
+            self._not_full.wait(max(self._q[0][1] - now, 0))
+            now = monotonic()
+            self._discard_old_items(now)
+        return True
+
+    def purge(self):
+        with self._not_empty:
+            self._discard_old_items(monotonic())
 
     def put(self, item):
-        self._validate()
-        expires_at = time.time() + self._max_ttl
-        self._q.put((item, expires_at))
+        """ Items put into a closed queue are silently dropped, it may be closed by an unsubscribe at any time """
+        now = monotonic()
+        size = len(item)
+        with self._not_empty:
+            if self._closed:
+                return
+            self._discard_old_items(now)
+            if not self._make_room(size, now):
+                self.dropped += 1
+                return
+            self._q.append((item, monotonic() + self._max_ttl))
+            self._bytes += size
+            self._not_empty.notify()
 
-    def get(self):
+    def get(self, timeout=None):
+        """ Next item, b'' on timeout or close; timeout defaults to the queue's """
         self._validate()
-        get_at = time.time()
-        try:
-            item, expires_at = self._q.get(True, self._timeout)
-            while expires_at <= get_at:
-                item, expires_at = self._q.get(True, self._timeout)
-            return item
-        # TODO only handle timeout exceptions
-        except:
-            return b''
+        now = monotonic()
+        timeout = self._timeout if timeout is None else timeout
+        deadline = None if timeout is None else now + timeout
+        with self._not_empty:
+            while True:
+                self._discard_old_items(now)
+                if self._q:
+                    item, expires_at = self._q.popleft()
+                    self._bytes -= len(item)
+                    self._not_full.notify()
+                    received_at = getattr(item, "received_at", None)
+                    if received_at is not None:
+                        self.latency.observe(now - received_at)
+                    return item
+
+                if self._closed:
+                    return b''
+
+                if deadline is None:
+                    self._not_empty.wait()
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        # timeout
+                        return b''
+                    self._not_empty.wait(remaining)
+                now = monotonic()
 
     def close(self):
         if self._closed:
             return
-        self._closed = True
-        self._watcher_thread.join()
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        _housekeeper.unregister(self)
 
     def is_closed(self):
         return self._closed
-        
\ No newline at end of file
+
+    def metrics(self):
+        return {
+            "depth": len(self._q),
+            "bytes": self._bytes,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "latency": self.latency.snapshot()
+        }
+
+    def __len__(self):
+        return len(self._q)
+
+    @property
+    def nbytes(self):
+        return self._bytes
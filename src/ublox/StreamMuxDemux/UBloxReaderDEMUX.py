@@ -1,19 +1,36 @@
 from logging import error
-from threading import Thread
+from threading import Lock, Thread
+from time import monotonic
 
-from .UBloxQueue import UBloxQueue
+from .UBloxQueue import UBloxQueue, DEFAULT_LIMITS
+from .UBloxFrameScanner import UBloxFrameScanner, NMEA, UBX, RTCM
+from .UBloxFrame import UBloxFrame
 from .StreamMuxDemuxError import StreamMuxDemuxError
 
 class UBloxReaderDEMUX:
-    def __init__(self, serial, ttl, timeout, onError=None):
+    def __init__(self, serial, ttl, timeout, onError=None, chunk_size=4096,
+                 nmea_limits=DEFAULT_LIMITS, ubx_limits=DEFAULT_LIMITS, rtcm_limits=DEFAULT_LIMITS):
         self._serial = serial
+        self._chunk_size = chunk_size
 
-        self._nmea_q = UBloxQueue(ttl, timeout)
-        self._ubx_q = UBloxQueue(ttl, timeout)
-        self._rtcm_q = UBloxQueue(ttl, timeout)
+        self._nmea_q = UBloxQueue(ttl, timeout, nmea_limits)
+        self._ubx_q = UBloxQueue(ttl, timeout, ubx_limits)
+        self._rtcm_q = UBloxQueue(ttl, timeout, rtcm_limits)
+        self._ttl = ttl
+        self._timeout = timeout
+
+        """ additional queues that receive a reference to every frame """
+        self._subscribers = {NMEA: (), UBX: (), RTCM: ()}
+        self._subscribers_lock = Lock()
 
         self._onError = onError
 
+        """ counters, only updated by the reader thread """
+        self.bytes_read = 0
+        self.garbage_bytes = 0
+        self.frames = {NMEA: 0, UBX: 0, RTCM: 0}
+        self.frame_bytes = {NMEA: 0, UBX: 0, RTCM: 0}
+
         self._closed = False
         self._reader_thread = Thread(target=self._read_to_queue)
         self._reader_thread.daemon = True
@@ -39,96 +56,94 @@ class UBloxReaderDEMUX:
     def _real_read_to_queue(self):
         self._validate()
         ser = self._serial
+        scanner = UBloxFrameScanner(self._garbage)
+        queues = {NMEA: self._nmea_q, UBX: self._ubx_q, RTCM: self._rtcm_q}
+
+        """ preallocated chunk buffer, filled with whatever the port has """
+        chunk = bytearray(self._chunk_size)
+        view = memoryview(chunk)
 
         while not self._closed:
-            frame = [ser.read()]
-
-            """ NMEA """
-            if frame[0] == b"$":
-                frame.append(ser.readline())
-
-                """ entire message """
-                msg = b"".join(frame)
-                
-                """ add msg to NMEA queue"""
-                for byte in msg:
-                    if self._nmea_q.is_closed():
-                        break
-                    self._nmea_q.put(byte.to_bytes(1, 'big'))
-
-                # done
+            # block for at least one byte, then take everything available
+            size = min(max(ser.in_waiting, 1), self._chunk_size)
+            n = ser.readinto(view[:size])
+            if not n:
                 continue
+            received_at = monotonic()
+            self.bytes_read += n
+
+            frames, frame_bytes = self.frames, self.frame_bytes
+            for protocol, msg in scanner.feed(chunk, n):
+                frames[protocol] += 1
+                frame_bytes[protocol] += len(msg)
+                frame = UBloxFrame(protocol, msg, received_at)
+                q = queues[protocol]
+                if not q.is_closed():
+                    q.put(frame)
+                for q in self._subscribers[protocol]:
+                    if not q.is_closed():
+                        q.put(frame)
+
+    def _garbage(self, data):
+        self.garbage_bytes += len(data)
+        if self._onError:
+            self._onError(data)
+
+    def readNMEA(self, timeout=None):
+        self._validate()
+        return self._nmea_q.get(timeout)
 
+    def readUBX(self, timeout=None):
+        self._validate()
+        return self._ubx_q.get(timeout)
 
-            """ UBX """
-            if frame[0] == b"\xb5":
-                frame.append(ser.read())
-                if frame[1] == b"\x62":
-                    frame.append(ser.read())                # class
-                    frame.append(ser.read())                # id
-                    length_bytes = ser.read(2)              # length
-                    frame.append(length_bytes)
-
-                    length = int.from_bytes(length_bytes, byteorder='little', signed=False)
-                    frame.append(ser.read(length))          # payload
-                    frame.append(ser.read())                # CK_A
-                    frame.append(ser.read())                # CK_B
-                    
-                    """ entire message """
-                    msg = b"".join(frame)
-
-                    """ add msg to UBX queue"""
-                    for byte in msg:
-                        if self._ubx_q.is_closed():
-                            break
-                        self._ubx_q.put(byte.to_bytes(1, 'little'))
-
-                    # done
-                    continue
-
-            
-            """ RTCM """
-            if frame[0] == b"\xD3":
-                frame.append(ser.read())                    # byte 2
-                frame.append(ser.read())                    # byte 3
-
-                num1 = int.from_bytes(frame[1], byteorder='little', signed=False)
-                num2 = int.from_bytes(frame[2], byteorder='little', signed=False)
-                length = ((num1 & 0b00000011) << 8) + num2
-                frame.append(ser.read(length))              # payload
-                frame.append(ser.read(3))                   # parity
-
-                """ entire message """
-                msg = b"".join(frame)
-
-                """ add msg to UBX queue"""
-                for byte in msg:
-                    if self._rtcm_q.is_closed():
-                        break
-                    self._rtcm_q.put(byte.to_bytes(1, 'little'))
-
-                # done
-                continue
+    def readRTCM(self, timeout=None):
+        self._validate()
+        return self._rtcm_q.get(timeout)
 
-            
-            """ error """
-            if self._onError:
-                data = b"".join(frame)
-                self._onError(data)
-    
+    def waitingNMEA(self):
+        return self._nmea_q.nbytes
 
-    
-    def readNMEA(self):
-        self._validate()
-        return self._nmea_q.get()
+    def waitingUBX(self):
+        return self._ubx_q.nbytes
 
-    def readUBX(self):
-        self._validate()
-        return self._ubx_q.get()
+    def waitingRTCM(self):
+        return self._rtcm_q.nbytes
 
-    def readRTCM(self):
+    def subscribe(self, protocol, limits=DEFAULT_LIMITS):
+        """ New queue that receives every frame of the given protocol """
         self._validate()
-        return self._rtcm_q.get()
+        if protocol not in self._subscribers:
+            raise ValueError(f"unknown protocol {protocol}")
+        q = UBloxQueue(self._ttl, self._timeout, limits)
+        with self._subscribers_lock:
+            self._subscribers[protocol] += (q,)
+        return q
+
+    def unsubscribe(self, q):
+        with self._subscribers_lock:
+            for protocol, queues in self._subscribers.items():
+                self._subscribers[protocol] = tuple(x for x in queues if x is not q)
+        q.close()
+
+    def dropped(self):
+        """ number of frames discarded by the overflow policy of each queue """
+        return {
+            NMEA: self._nmea_q.dropped,
+            UBX: self._ubx_q.dropped,
+            RTCM: self._rtcm_q.dropped
+        }
+
+    def metrics(self):
+        queues = {NMEA: self._nmea_q, UBX: self._ubx_q, RTCM: self._rtcm_q}
+        return {
+            "bytes": self.bytes_read,
+            "garbage_bytes": self.garbage_bytes,
+            "frames": dict(self.frames),
+            "frame_bytes": dict(self.frame_bytes),
+            "queues": {protocol: q.metrics() for protocol, q in queues.items()},
+            "subscribers": {protocol: len(qs) for protocol, qs in self._subscribers.items()}
+        }
 
     def close(self):
         if self._closed:
@@ -137,6 +152,9 @@ class UBloxReaderDEMUX:
         self._nmea_q.close()
         self._ubx_q.close()
         self._rtcm_q.close()
+        for queues in self._subscribers.values():
+            for q in queues:
+                q.close()
 
         try:
             self._reader_thread.join()
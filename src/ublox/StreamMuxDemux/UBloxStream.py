@@ -1,26 +1,105 @@
 class UBloxStream():
-    def __init__(self, read_func, write_func, stream_mux_demux):
+    def __init__(self, read_func, write_func, stream_mux_demux, waiting_func=None, close_func=None):
         self._read = read_func
         self._write = write_func
+        self._waiting = waiting_func
+        self._close = close_func
         self._stream_mux_demux = stream_mux_demux
 
+        """ frame currently being consumed, its bytes and the position within them """
+        self._current = None
+        self._frame = b""
+        self._pos = 0
+
+    def _fill(self, timeout=None):
+        """ Number of unread bytes in the current frame, fetches the next frame if needed """
+        if self._pos >= len(self._frame):
+            frame = self._read() if timeout is None else self._read(timeout)
+            self._current = frame or None
+            self._frame = frame.raw if frame else b""
+            self._pos = 0
+        return len(self._frame) - self._pos
+
+    def _take(self, n):
+        """ Up to n bytes from the current frame, in a single slice """
+        start = self._pos
+        self._pos = min(start + n, len(self._frame))
+        if start == 0 and self._pos == len(self._frame):
+            return self._frame
+        return self._frame[start:self._pos]
+
     def read(self, n=1):
-        result = b""
-        for i in range(n):
-            result += self._read()
-        return result
+        if not self._fill():
+            # timeout
+            return b""
+
+        chunk = self._take(n)
+        if len(chunk) == n:
+            return chunk
+
+        """ spans several frames """
+        chunks = [chunk]
+        missing = n - len(chunk)
+        while missing and self._fill():
+            chunk = self._take(missing)
+            chunks.append(chunk)
+            missing -= len(chunk)
+        return b"".join(chunks)
+
+    def read_frame(self, timeout=None):
+        """
+        The next UBloxFrame, or None on timeout. If the current frame has
+        been partially consumed by read(), its unread rest is skipped.
+        timeout overrides the serial port's timeout for this call.
+        """
+        if self._pos:
+            self._pos = len(self._frame)
+        if not self._fill(timeout):
+            return None
+        self._pos = len(self._frame)
+        return self._current
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        n = 0
+        while n < len(view) and self._fill():
+            chunk = self._take(len(view) - n)
+            view[n:n + len(chunk)] = chunk
+            n += len(chunk)
+        return n
 
     def readline(self):
-        byte = self._read()
-        result = byte
-        while byte != b'\n':
-            byte = self._read()
-            result += byte
-        return result
+        chunks = []
+        while self._fill():
+            end = self._frame.find(b"\n", self._pos)
+            if end >= 0:
+                chunks.append(self._take(end + 1 - self._pos))
+                break
+            chunks.append(self._take(len(self._frame)))
+        return b"".join(chunks)
+
+    def peek(self, n=1):
+        """ Up to n bytes of the current frame without consuming them; may return fewer """
+        if not self._fill():
+            return b""
+        return self._frame[self._pos:self._pos + n]
+
+    @property
+    def in_waiting(self):
+        """ Number of bytes that can be read without waiting for the receiver """
+        waiting = len(self._frame) - self._pos
+        if self._waiting:
+            waiting += self._waiting()
+        return waiting
 
     def write(self, data):
         self._write(data)
 
+    def close(self):
+        """ Unsubscribe; the default per-protocol streams are closed with their owner """
+        if self._close:
+            self._close()
+
     @property
     def owner(self):
         return self._stream_mux_demux
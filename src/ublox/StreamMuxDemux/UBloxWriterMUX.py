@@ -1,12 +1,35 @@
-from queue import Queue
-from threading import Thread
+from collections import deque
+from threading import Condition, Thread
 
 from .StreamMuxDemuxError import StreamMuxDemuxError
+from .UBloxFrameScanner import NMEA, UBX, RTCM
+
+""" UBX control traffic first, then RTCM corrections, then everything else """
+PRIORITY = (UBX, RTCM, NMEA)
+
+MAX_WRITE_SIZE = 4096
+
 
 class UBloxWriterMUX:
-    def __init__(self, serial):
+    """
+    Funnels the writes of all protocols into the serial port. Whatever is
+    pending when the writer thread wakes up is written with a single
+    serial.write(), in priority order and up to max_write_size bytes. Data
+    passed to a single write call is never split or interleaved with other
+    data. onWrite, if given, is called with the data after each serial write.
+    """
+
+    def __init__(self, serial, max_write_size=MAX_WRITE_SIZE, onWrite=None):
         self._serial = serial
-        self._q = Queue()
+        self._max_write_size = max_write_size
+        self._onWrite = onWrite
+        self._queues = {protocol: deque() for protocol in PRIORITY}
+        self._pending = 0
+        self._pending_bytes = 0
+        self._cv = Condition()
+
+        self.writes = 0
+        self.bytes_written = 0
 
         self._closed = False
         self._writer_thread = Thread(target=self._write_from_queue)
@@ -25,41 +48,81 @@ class UBloxWriterMUX:
         except Exception as e:
             self.close()
             error = e
-        
+
         if error:
             raise StreamMuxDemuxError(error)
 
+    def _next_batch(self):
+        """ must be called with self._cv held """
+        batch = []
+        size = 0
+        for protocol in PRIORITY:
+            q = self._queues[protocol]
+            while q:
+                if batch and size + len(q[0]) > self._max_write_size:
+                    return batch
+                data = q.popleft()
+                batch.append(data)
+                size += len(data)
+                self._pending -= 1
+                self._pending_bytes -= len(data)
+        return batch
+
     def _real_write_from_queue(self):
         self._validate()
         while not self._closed:
-            try:
-                msg = self._q.get(timeout=1)
-            # TODO: change exception type to only timeout exceptions
-            except Exception as e:
+            with self._cv:
+                if not self._pending:
+                    self._cv.wait(timeout=1)
+                batch = self._next_batch()
+
+            if not batch:
                 continue
 
-            self._serial.write(msg)
+            data = batch[0] if len(batch) == 1 else b"".join(batch)
+            self._serial.write(data)
+            self.writes += 1
+            self.bytes_written += len(data)
+            if self._onWrite:
+                self._onWrite(data)
 
-    def writeNMEA(self, data):
+    def _put(self, protocol, data):
         self._validate()
-        self._q.put(data)
+        if not data:
+            return
+        with self._cv:
+            self._queues[protocol].append(data)
+            self._pending += 1
+            self._pending_bytes += len(data)
+            self._cv.notify()
+
+    def writeNMEA(self, data):
+        self._put(NMEA, data)
 
     def writeUBX(self, data):
-        self._validate()
-        self._q.put(data)
+        self._put(UBX, data)
 
     def writeRTCM(self, data):
-        self._validate()
-        self._q.put(data)
+        self._put(RTCM, data)
+
+    def metrics(self):
+        return {
+            "writes": self.writes,
+            "bytes": self.bytes_written,
+            "backlog_frames": self._pending,
+            "backlog_bytes": self._pending_bytes
+        }
 
     def close(self):
         if self._closed:
             return
         self._closed = True
+        with self._cv:
+            self._cv.notify()
         try:
             self._writer_thread.join()
         except:
             pass
-        
+
     def is_closed(self):
         return self._closed
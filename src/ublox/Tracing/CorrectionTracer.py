@@ -0,0 +1,157 @@
+import argparse
+import json
+import sys
+from bisect import bisect_right
+from threading import Lock
+from time import monotonic, time
+
+from ..StreamMuxDemux.UBloxFrameScanner import frame_end
+
+""" hops of a correction from the base receiver to the rover receiver, in order """
+EVENTS = ("arrival", "transport", "reassembly", "injection", "consumed")
+
+""" events further apart than this are not considered the same frame """
+MAX_HOP_TIME = 10
+
+
+def frame_key(raw):
+    """ RTCM message number and CRC-24Q identify a frame on both ends of the link """
+    msg_type = (raw[3] << 4) | (raw[4] >> 4) if len(raw) >= 8 else None
+    return msg_type, raw[-3:].hex()
+
+
+def rtcm_frames(data):
+    """
+    The RTCM frames contained in data, which may also contain other protocols:
+    reserved bits and CRC-24Q are checked, a 0xD3 inside e.g. a UBX payload is skipped
+    """
+    pos = 0
+    while pos < len(data):
+        if data[pos] == 0xD3:
+            stop = frame_end(data, pos, len(data))
+            if stop > 0:
+                yield data[pos:stop]
+                pos = stop
+                continue
+        pos += 1
+
+
+class CorrectionTracer:
+    """
+    Records when each RTCM frame passes a hop of the correction path, as JSON
+    lines appended to path. Base and rover each write their own trace; report()
+    correlates them on frame_key(). Timestamps are wall clock so that traces
+    from both hosts can be compared, which assumes their clocks are
+    synchronized (e.g. NTP or PPS-disciplined).
+    """
+
+    def __init__(self, path, host):
+        """ line buffered, a trace must survive the process being killed """
+        self._file = open(path, "a", buffering=1)
+        self._host = host
+        self._lock = Lock()
+
+        """ per RTCM message number, key of the frame last injected into the receiver """
+        self._injected = {}
+
+    def _write(self, event, key, t):
+        line = json.dumps({"host": self._host, "event": event, "type": key[0], "key": key[1], "t": t})
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def stamp(self, event, raw, received_at=None):
+        """ Record a frame passing a hop; received_at is a monotonic timestamp, default now """
+        now = time()
+        t = now if received_at is None else now - (monotonic() - received_at)
+        key = frame_key(raw)
+        if event == "injection":
+            self._injected[key[0]] = key
+        self._write(event, key, t)
+
+    def stamp_data(self, event, data):
+        """ Record every RTCM frame contained in data written in one go """
+        for raw in rtcm_frames(data):
+            self.stamp(event, raw)
+
+    def stamp_rxm_rtcm(self, frame, msg):
+        """ UBX-RXM-RTCM handler: the receiver has used the last injected frame of a type """
+        key = self._injected.get(msg.msgType)
+        # msgUsed: 0 unknown, 1 not used, 2 used
+        if key is not None and msg.msgUsed == 2:
+            self._write("consumed", key, time())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def load(paths):
+    events = {event: {} for event in EVENTS}
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record["event"] in events:
+                    key = (record["type"], record["key"])
+                    events[record["event"]].setdefault(key, []).append(record["t"])
+    for per_key in events.values():
+        for times in per_key.values():
+            times.sort()
+    return events
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    return values[min(int(p / 100 * len(values)), len(values) - 1)]
+
+
+def report(paths):
+    """ Per-hop latency percentiles in seconds, {hop: {count, p50, p90, p99, max}} """
+    events = load(paths)
+    result = {}
+    for start, end in zip(EVENTS, EVENTS[1:]):
+        deltas = []
+        for key, end_times in events[end].items():
+            start_times = events[start].get(key)
+            if not start_times:
+                continue
+            for t in end_times:
+                """ the latest start of the same frame before it reached this hop """
+                i = bisect_right(start_times, t)
+                if i and t - start_times[i - 1] <= MAX_HOP_TIME:
+                    deltas.append(t - start_times[i - 1])
+        deltas.sort()
+        result[f"{start}->{end}"] = {
+            "count": len(deltas),
+            "p50": percentile(deltas, 50),
+            "p90": percentile(deltas, 90),
+            "p99": percentile(deltas, 99),
+            "max": deltas[-1] if deltas else None
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-hop latency of RTCM corrections from base and rover traces")
+    parser.add_argument("traces", nargs="+", help="trace files written by CorrectionTracer")
+    parser.add_argument("--json", action="store_true", help="print machine readable output")
+    args = parser.parse_args()
+
+    result = report(args.traces)
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    print(f"{'hop':<24} {'count':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for hop, stats in result.items():
+        print(f"{hop:<24} {stats['count']:>8} {ms(stats['p50']):>9} {ms(stats['p90']):>9} "
+              f"{ms(stats['p99']):>9} {ms(stats['max']):>9}")
+
+
+if __name__ == "__main__":
+    main()
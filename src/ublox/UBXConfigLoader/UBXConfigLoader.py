@@ -0,0 +1,156 @@
+import logging
+from collections import deque, namedtuple
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from ..StreamMuxDemux.UBloxFrameScanner import UBloxFrameScanner, UBX
+from ..StreamMuxDemux.UBloxFrame import UBloxFrame
+from ..UBXSerializer.UBXSerializer import MAX_KEYS, cfg_items, valset_frame
+from ..UBXRequester.UBXRequester import UBXRequester
+from ..UBXRequester.UBXNakError import UBXNakError
+
+log = logging.getLogger(__name__)
+
+CFG_CLASS = 0x06
+CFG_VALGET = 0x8B
+
+""" a configuration message the receiver rejected (NAK) or never answered (timeout) """
+ConfigFailure = namedtuple('ConfigFailure', 'frame reason attempts')
+
+
+class _Pending:
+    __slots__ = ('frame', 'attempts', 'response')
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.attempts = 0
+        self.response = None
+
+
+class UBXConfigLoader:
+    """
+    Uploads UBX configuration messages, e.g. the output of
+    UBXSerializer.serialize(), and waits for the receiver to acknowledge them.
+
+    Up to depth CFG messages are in flight at once, as UBXRequester requests.
+    UBX-ACK-ACK/ACK-NAK only name the class and id of the message they
+    answer and the receiver answers in order, so acknowledgements are matched
+    first-in first-out per (class, id); if the receiver silently drops a
+    message, a later answer is credited to it, which depth=1 rules out.
+    Messages that time out are resent up to retries times; a NAK is final,
+    resending the same keys would be rejected again. Messages outside the
+    CFG class are not acknowledged and are just written.
+    """
+
+    def __init__(self, ubx_stream, depth=4, timeout=1, retries=2):
+        self._stream = ubx_stream
+        self._depth = depth
+        self._timeout = timeout
+        self._retries = retries
+
+    def load(self, bin_data):
+        """
+        Send all messages in bin_data and return as soon as every one is
+        acknowledged or has failed. Returns the list of ConfigFailures, which
+        is empty if the whole configuration was accepted.
+        """
+        return self._run(bin_data)[1]
+
+    def poll(self, bin_data):
+        """
+        Send the UBX-CFG-VALGET polls in bin_data and return the response
+        frame to each of them, None where the receiver answered with a NAK
+        or did not answer.
+        """
+        return [pending.response for pending in self._run(bin_data)[0]]
+
+    def apply(self, plan):
+        """
+        Differential upload of a configuration compiled by
+        UBXSerializer.plan(). The UBX-CFG-VALSET keys of each layer are
+        polled first and only keys whose value differs are set, so an
+        unchanged configuration costs one round of polls and no Flash or BBR
+        writes. Chunks the receiver does not answer, e.g. keys not stored in
+        BBR or Flash yet, are set completely. UBX-CFG-VALDEL and VALGET are
+        sent unchanged. Returns the list of ConfigFailures.
+        """
+        chunks = [chunk for entry in plan for step in entry["steps"] for chunk in step.get("chunks", ())]
+        responses = self.poll(b"".join(bytes.fromhex(chunk["poll"]) for chunk in chunks))
+
+        changes = []
+        for chunk, response in zip(chunks, responses):
+            wanted = [(key, bytes.fromhex(value)) for key, value in chunk["wanted"]]
+            if response is not None:
+                current = dict(cfg_items(response))
+                wanted = [(key, value) for key, value in wanted if current.get(key) != value]
+            changes.append(wanted)
+
+        total = sum(len(chunk["wanted"]) for chunk in chunks)
+        log.info(f"{sum(len(changed) for changed in changes)} of {total} configuration keys changed")
+
+        changes = iter(changes)
+        frames = []
+        for entry in plan:
+            for step in entry["steps"]:
+                if "frames" in step:
+                    frames.append(bytes.fromhex(step["frames"]))
+                    continue
+                changed = [item for chunk in step["chunks"] for item in next(changes)]
+                for i in range(0, len(changed), MAX_KEYS):
+                    frames.append(valset_frame(changed[i:i + MAX_KEYS], entry["layer"]))
+        return self.load(b"".join(frames))
+
+    def _run(self, bin_data):
+        """ Send bin_data; returns the _Pending of each CFG message and the failures """
+        frames = deque(_Pending(frame) for protocol, frame in UBloxFrameScanner(protocols=(UBX,)).feed(bin_data))
+        sent = [pending for pending in frames if pending.frame[2] == CFG_CLASS]
+        failures = []
+        in_flight = {}
+
+        with UBXRequester(self._stream, self._timeout) as requester:
+            while frames or in_flight:
+                while frames and len(in_flight) < self._depth:
+                    pending = frames.popleft()
+                    raw = pending.frame
+                    if raw[2] != CFG_CLASS:
+                        self._stream.write(raw)
+                        continue
+                    pending.attempts += 1
+                    if raw[3] == CFG_VALGET:
+                        """ a poll is answered by the response with its layer and first key """
+                        future = requester.request(raw, match=self._valget_match(raw))
+                    else:
+                        future = requester.request(raw, ack=True)
+                    in_flight[future] = pending
+
+                if not in_flight:
+                    continue
+                done, not_done = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending = in_flight.pop(future)
+                    try:
+                        pending.response = future.result().raw
+                    except UBXNakError:
+                        failures.append(ConfigFailure(self._frame(pending), "NAK", pending.attempts))
+                    except TimeoutError:
+                        if pending.attempts <= self._retries:
+                            log.warning(f"no answer to {self._frame(pending)}, resending")
+                            frames.appendleft(pending)
+                        else:
+                            failures.append(ConfigFailure(self._frame(pending), "timeout", pending.attempts))
+        return sent, failures
+
+    @staticmethod
+    def _valget_match(poll):
+        """
+        A response echoes the layer (payload offset 1) of its poll and lists
+        some of its keys from offset 4, possibly leaving out keys the layer does
+        not store. Polls in flight together ask for distinct keys, so the first
+        key listed tells which poll is answered.
+        """
+        keys = {bytes(poll[i:i + 4]) for i in range(10, len(poll) - 2, 4)}
+        return lambda frame: (frame.raw[2:4] == poll[2:4] and frame.raw[7] == poll[7]
+                              and bytes(frame.raw[10:14]) in keys)
+
+    @staticmethod
+    def _frame(pending):
+        return UBloxFrame(UBX, pending.frame, None)
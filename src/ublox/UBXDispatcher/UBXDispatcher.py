@@ -0,0 +1,89 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+""" 'NAV-SVIN' -> (0x01, 0x3B), filled from pyubx2 on first use """
+UBX_MESSAGES = {}
+
+""" pyubx2's UBXReader.parse, looked up on first use """
+_parse = None
+
+
+def message_key(message):
+    """ (class, id) for a message name like 'NAV-STATUS' or a (class, id) tuple """
+    if isinstance(message, str):
+        if not UBX_MESSAGES:
+            from pyubx2.ubxtypes_core import UBX_MSGIDS
+            UBX_MESSAGES.update((name, (key[0], key[1])) for key, name in UBX_MSGIDS.items())
+        try:
+            return UBX_MESSAGES[message]
+        except KeyError:
+            raise ValueError(f"unknown UBX message {message}")
+    return tuple(message)
+
+
+def parse(raw):
+    """ Decode a UBX frame to a pyubx2 UBXMessage """
+    global _parse
+    if _parse is None:
+        from pyubx2 import UBXReader
+        _parse = UBXReader.parse
+    return _parse(raw)
+
+
+class UBXDispatcher:
+    """
+    Long-lived UBX consumer. Frames read from a UBloxStream are routed on
+    their (class, id) header to the handlers registered for them. Only
+    messages with at least one decoding handler are parsed by pyubx2;
+    everything else is passed to default as a raw UBloxFrame, or skipped.
+    """
+
+    def __init__(self, ubx_stream, default=None):
+        self._stream = ubx_stream
+        self._default = default
+        self._handlers = {}
+
+    def subscribe(self, message, callback, decode=True):
+        """
+        Call callback(frame, msg) for every message of the given type. msg is
+        the decoded pyubx2 UBXMessage, or None if decode is False.
+        """
+        key = message_key(message)
+        self._handlers[key] = self._handlers.get(key, ()) + ((callback, decode),)
+
+    def unsubscribe(self, message, callback):
+        key = message_key(message)
+        handlers = tuple(h for h in self._handlers.get(key, ()) if h[0] != callback)
+        if handlers:
+            self._handlers[key] = handlers
+        else:
+            self._handlers.pop(key, None)
+
+    def dispatch(self, frame):
+        handlers = self._handlers.get((frame.raw[2], frame.raw[3]))
+        if not handlers:
+            if self._default:
+                self._default(frame)
+            return
+
+        msg = None
+        if any(decode for callback, decode in handlers):
+            try:
+                msg = parse(frame.raw)
+            except Exception as e:
+                log.error(f"failed to parse {frame}: {e}")
+                return
+
+        for callback, decode in handlers:
+            try:
+                callback(frame, msg if decode else None)
+            except Exception as e:
+                log.error(e)
+
+    def run(self):
+        """ Dispatch until the stream is closed (StreamMuxDemuxError) """
+        while True:
+            frame = self._stream.read_frame()
+            if frame is not None:
+                self.dispatch(frame)
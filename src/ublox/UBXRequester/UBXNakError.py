@@ -0,0 +1,2 @@
+class UBXNakError(Exception):
+    pass
@@ -0,0 +1,181 @@
+from concurrent.futures import Future, InvalidStateError
+from threading import Condition, Thread
+from time import monotonic
+
+from ..StreamMuxDemux.StreamMuxDemuxError import StreamMuxDemuxError
+from ..StreamMuxDemux.UBloxFrameScanner import UBX
+from ..StreamMuxDemux.UBloxQueue import DEFAULT_LIMITS
+from ..UBXDispatcher.UBXDispatcher import message_key
+from .UBXNakError import UBXNakError
+
+ACK_CLASS = 0x05
+ACK_NAK = 0x00
+ACK_ACK = 0x01
+
+
+class _Request:
+    __slots__ = ('key', 'match', 'ack', 'deadline', 'future')
+
+    def __init__(self, key, match, ack, deadline):
+        self.key = key
+        self.match = match
+        self.ack = ack
+        self.deadline = deadline
+        self.future = Future()
+
+    def matches(self, frame):
+        if callable(self.match):
+            return self.match(frame)
+        return frame.identity == self.match
+
+
+def _resolve(future, result=None, error=None):
+    """ no-op if the caller cancelled the future meanwhile """
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class UBXRequester:
+    """
+    Request/response on top of a UBX stream: polls such as MON-VER or
+    CFG-VALGET and acknowledged commands are sent with request(), which
+    returns a concurrent.futures.Future for the answer (use
+    asyncio.wrap_future() to await it). Any number of requests may be
+    outstanding; each one times out on its own.
+
+    Answers are taken from a subscription of their own, so the regular UBX
+    consumers still see every frame. A frame answers the oldest outstanding
+    request it matches. UBX-ACK-NAK of a request fails it with UBXNakError,
+    UBX-ACK-ACK completes requests made with ack=True.
+    """
+
+    def __init__(self, ubx_stream, timeout=1, limits=DEFAULT_LIMITS):
+        self._stream = ubx_stream
+        self._timeout = timeout
+        self._subscription = ubx_stream.owner.subscribe(UBX, limits)
+
+        """ outstanding requests, oldest first """
+        self._requests = []
+        self._cv = Condition()
+
+        self._closed = False
+        self._reader_thread = Thread(target=self._read_answers)
+        self._reader_thread.daemon = True
+        self._reader_thread.start()
+        self._timer_thread = Thread(target=self._expire_requests)
+        self._timer_thread.daemon = True
+        self._timer_thread.start()
+
+    def _validate(self):
+        if self._closed:
+            raise StreamMuxDemuxError("Use of a closed UBXRequester")
+
+    def request(self, msg, match=None, timeout=None, ack=False):
+        """
+        Send msg (a pyubx2 UBXMessage or a serialized frame) and return a
+        Future for the UBloxFrame answering it. match selects the answer: a
+        message name like 'MON-VER', a (class, id) tuple or a callable taking
+        the UBloxFrame, e.g. to tell CFG-VALGET replies apart by their keys;
+        it defaults to the class and id of msg. With ack=True the UBX-ACK-ACK
+        of msg is the answer. Fails with TimeoutError after timeout seconds.
+        """
+        self._validate()
+        raw = msg.serialize() if hasattr(msg, "serialize") else bytes(msg)
+        key = (raw[2], raw[3])
+        if match is None:
+            match = key
+        elif not callable(match):
+            match = message_key(match)
+
+        timeout = self._timeout if timeout is None else timeout
+        request = _Request(key, match, ack, monotonic() + timeout)
+        with self._cv:
+            self._requests.append(request)
+            self._cv.notify()
+
+        """ registered before sending, so the answer cannot be missed """
+        self._stream.write(raw)
+        return request.future
+
+    def _read_answers(self):
+        try:
+            while not self._closed:
+                frame = self._subscription.read_frame()
+                if frame is not None:
+                    self._dispatch(frame)
+        except StreamMuxDemuxError:
+            # unsubscribed or closed
+            return
+
+    def _answered(self, frame):
+        """ must be called with self._cv held; the request answered by frame, with its result or error """
+        raw = frame.raw
+        if raw[2] == ACK_CLASS and raw[3] in (ACK_ACK, ACK_NAK) and len(raw) >= 10:
+            key = (raw[6], raw[7])
+            nak = raw[3] == ACK_NAK
+            for request in self._requests:
+                if request.key == key and (request.ack or nak):
+                    if nak:
+                        return request, None, UBXNakError(f"UBX {key} rejected by the receiver")
+                    return request, frame, None
+
+        for request in self._requests:
+            if request.matches(frame):
+                return request, frame, None
+        return None, None, None
+
+    def _dispatch(self, frame):
+        with self._cv:
+            request, result, error = self._answered(frame)
+            if request is None:
+                return
+            self._requests.remove(request)
+        _resolve(request.future, result, error)
+
+    def _expire_requests(self):
+        while True:
+            with self._cv:
+                if self._closed:
+                    return
+                now = monotonic()
+                expired = [request for request in self._requests if request.deadline <= now]
+                if expired:
+                    self._requests = [request for request in self._requests if request.deadline > now]
+                else:
+                    deadline = min((request.deadline for request in self._requests), default=None)
+                    self._cv.wait(None if deadline is None else deadline - now)
+
+            for request in expired:
+                _resolve(request.future, error=TimeoutError(f"no answer to UBX {request.key}"))
+
+    def pending(self):
+        """ number of outstanding requests """
+        return len(self._requests)
+
+    def close(self):
+        """ Unsubscribe and cancel all outstanding requests """
+        if self._closed:
+            return
+        with self._cv:
+            self._closed = True
+            requests, self._requests = self._requests, []
+            self._cv.notify_all()
+        self._subscription.close()
+        for request in requests:
+            request.future.cancel()
+        self._reader_thread.join()
+        self._timer_thread.join()
+
+    def is_closed(self):
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,13 +1,46 @@
-import yaml
-import jsonschema
-from pyubx2 import UBXMessage
+import hashlib
+import json
+import os
+from functools import lru_cache
+from importlib.util import find_spec
 from .schema import schema
+from ..StreamMuxDemux.UBloxChecksum import ubx_checksum
+
+"""
+yaml, jsonschema and pyubx2 are imported where they are used: a cache hit
+needs none of them, and importing them costs more than the hit saves.
+"""
+
+""" compiled configurations, keyed by the hash of the YAML, None disables caching """
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "ublox")
+
+""" bump whenever to_binary produces different output for the same YAML """
+CACHE_FORMAT = 2
+
+""" most keys a receiver accepts in a single UBX-CFG-VAL* message """
+MAX_KEYS = 64
+
+""" value size in bytes, by the size field (bits 28-30) of a configuration key id """
+KEY_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8}
+
+""" layer bit mask of UBX-CFG-VALSET """
+VALSET_LAYERS = {"RAM": 1, "BBR": 2, "Flash": 4}
+
+
+@lru_cache(maxsize=None)
+def validator():
+    """ the schema validator, checked and compiled once per process """
+    from jsonschema.validators import validator_for
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema)
+
 
 def validate(config):
-    try:
-        error = None
-        jsonschema.validate(config, schema)
-    except jsonschema.ValidationError as e:
+    from jsonschema.exceptions import best_match
+    error = None
+    e = best_match(validator().iter_errors(config))
+    if e is not None:
         while e.parent:
             e = e.parent
         path_entries = [str(entry) for entry in e.path]
@@ -40,18 +73,28 @@ def cleanup(config):
 
 
 def ubx_cfg_valget(cfg_data, layer):
+    from pyubx2 import UBXMessage
     memory_layer_to_code = {"RAM": 0, "BBR": 1, "Flash": 2, "Default": 7}
     layer_data = memory_layer_to_code[layer]
     return UBXMessage.config_poll(layer_data, 0, cfg_data).serialize()
 
 
 def ubx_cfg_valset(cfg_data, layer):
-    memory_layer_to_code = { "RAM": 1, "BBR": 2, "Flash": 4}
-    layer_data = memory_layer_to_code[layer]
+    from pyubx2 import UBXMessage
+    layer_data = VALSET_LAYERS[layer]
     return UBXMessage.config_set(layer_data, 0, cfg_data).serialize()
 
 
+def valset_frame(items, layer):
+    """ UBX-CFG-VALSET from (key id, value bytes) pairs, built without pyubx2 """
+    payload = bytes([0, VALSET_LAYERS[layer], 0, 0])
+    payload += b"".join(key.to_bytes(4, "little") + value for key, value in items)
+    body = b"\x06\x8a" + len(payload).to_bytes(2, "little") + payload
+    return b"\xb5\x62" + body + bytes(ubx_checksum(body))
+
+
 def ubx_cfg_valdel(cfg_data, layer):
+    from pyubx2 import UBXMessage
     memory_layer_to_code = {"BBR": 2, "Flash": 4}
     layer_data = memory_layer_to_code[layer]
     return UBXMessage.config_del(layer_data, 0, cfg_data).serialize()
@@ -64,22 +107,143 @@ def to_binary(config):
         for method_name in layer:
             method_data = layer[method_name]
             if method_name == 'UBX-CFG-VALSET':
-                result += ubx_cfg_valset(method_data, layer_name)
+                method = ubx_cfg_valset
             elif method_name == 'UBX-CFG-VALDEL':
-                result += ubx_cfg_valdel(method_data, layer_name)
+                method = ubx_cfg_valdel
             elif method_name == 'UBX-CFG-VALGET':
-                result += ubx_cfg_valget(method_data, layer_name)
+                method = ubx_cfg_valget
             else:
                 raise ValueError(f"invalid configuration method {method_name}")
+            for i in range(0, len(method_data), MAX_KEYS):
+                result += method(method_data[i:i + MAX_KEYS], layer_name)
     return result
 
 
+def cfg_items(frame):
+    """ (key id, value bytes) of each key in a UBX-CFG-VALSET or UBX-CFG-VALGET response frame """
+    payload = memoryview(frame)[10:-2]
+    items = []
+    pos = 0
+    while pos + 4 <= len(payload):
+        key = int.from_bytes(payload[pos:pos + 4], "little")
+        size = KEY_SIZES.get((key >> 28) & 0x7)
+        if size is None:
+            raise ValueError(f"invalid configuration key {key:#010x}")
+        items.append((key, bytes(payload[pos + 4:pos + 4 + size])))
+        pos += 4 + size
+    return items
+
+
+@lru_cache(maxsize=None)
+def pyubx2_version():
+    """ read from pyubx2/_version.py, without importing pyubx2 """
+    try:
+        with open(os.path.join(find_spec("pyubx2").submodule_search_locations[0], "_version.py"), "rb") as f:
+            return f.read()
+    except (OSError, AttributeError, TypeError):
+        from pyubx2 import version
+        return version.encode()
+
+
+def compile_plan(config):
+    """
+    Cleaned configuration compiled for UBXConfigLoader.apply(): for each
+    layer, its methods in order, UBX-CFG-VALSET as chunks of the VALGET poll
+    and the wanted (key id, value) pairs, everything else as ready frames.
+    Bytes are hex encoded so the plan can be cached as JSON.
+    """
+    plan = []
+    for layer_name, layer in config.items():
+        steps = []
+        for method_name, method_data in layer.items():
+            if method_name != 'UBX-CFG-VALSET':
+                steps.append({"frames": to_binary({layer_name: {method_name: method_data}}).hex()})
+                continue
+            chunks = []
+            for i in range(0, len(method_data), MAX_KEYS):
+                chunk = method_data[i:i + MAX_KEYS]
+                chunks.append({
+                    "poll": ubx_cfg_valget([key for key, value in chunk], layer_name).hex(),
+                    "wanted": [[key, value.hex()] for key, value in cfg_items(ubx_cfg_valset(chunk, layer_name))]
+                })
+            steps.append({"chunks": chunks})
+        plan.append({"layer": layer_name, "steps": steps})
+    return plan
+
+
+def cache_path(ubx_config, cache_dir, extension=".ubx"):
+    if isinstance(ubx_config, str):
+        ubx_config = ubx_config.encode()
+    key = hashlib.sha256(f"{CACHE_FORMAT}:".encode() + pyubx2_version() + ubx_config).hexdigest()
+    return os.path.join(cache_dir, key + extension)
+
+
+def read_cache(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_cache(path, bin_data):
+    """ atomic, so a concurrent or interrupted start never sees a partial blob """
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(bin_data)
+        os.replace(tmp, path)
+    except OSError:
+        # caching is an optimization only
+        pass
+
+
+def _load_config(ubx_config):
+    """ Validated and cleaned configuration (layer -> method -> keys) of the YAML text """
+    import yaml
+    config = yaml.safe_load(ubx_config)
+    validate(config)
+    return cleanup(config)
+
+
 class UBXSerializer:
     @staticmethod
-    def serialize(ubx_config):
-        # TODO:
-        config = yaml.safe_load(ubx_config)
-        validate(config)
-        config = cleanup(config)
-        bin_data = to_binary(config)
-        return bin_data
\ No newline at end of file
+    def serialize(ubx_config, cache_dir=CACHE_DIR):
+        """
+        Compile a YAML configuration (string or file) to UBX-CFG-VAL* messages.
+        The result is cached in cache_dir, keyed by the YAML and the pyubx2
+        version, so an unchanged configuration is a single file read.
+        """
+        if hasattr(ubx_config, "read"):
+            ubx_config = ubx_config.read()
+
+        path = cache_path(ubx_config, cache_dir) if cache_dir else None
+        bin_data = read_cache(path) if path else None
+        if bin_data is not None:
+            return bin_data
+
+        bin_data = to_binary(_load_config(ubx_config))
+        if path:
+            write_cache(path, bin_data)
+        return bin_data
+
+    @staticmethod
+    def plan(ubx_config, cache_dir=CACHE_DIR):
+        """
+        The configuration compiled for UBXConfigLoader.apply(), see
+        compile_plan(), cached as JSON like serialize(). A cache hit needs
+        neither pyubx2 nor any message construction.
+        """
+        if hasattr(ubx_config, "read"):
+            ubx_config = ubx_config.read()
+
+        path = cache_path(ubx_config, cache_dir, ".plan.json") if cache_dir else None
+        data = read_cache(path) if path else None
+        if data is not None:
+            return json.loads(data)
+
+        plan = compile_plan(_load_config(ubx_config))
+        if path:
+            write_cache(path, json.dumps(plan).encode())
+        return plan
@@ -1,3 +1,47 @@
+from importlib import import_module
+
 from .StreamMuxDemux.StreamMuxDemux import StreamMuxDemux
-from .StreamMuxDemux.StreamMuxDemuxError import StreamMuxDemuxError
 from .UBXSerializer.UBXSerializer import UBXSerializer
+from .UBXDispatcher.UBXDispatcher import UBXDispatcher
+from .LogPipeline.LogPipeline import LogPipeline
+from .UBXConfigLoader.UBXConfigLoader import UBXConfigLoader
+from .UBXRequester.UBXRequester import UBXRequester
+
+"""
+Imported on first access (PEP 562), so entry points only pay for what they
+use. The classes above share their name with their subpackage and are
+imported eagerly instead: importing any module of the subpackage would bind
+the subpackage under that name and hide the class. Their modules keep
+their heavy dependencies (pyubx2, yaml, jsonschema) out of import time.
+"""
+_LAZY = {
+    "AsyncStreamMuxDemux": ".StreamMuxDemux.AsyncStreamMuxDemux",
+    "StreamMuxDemuxError": ".StreamMuxDemux.StreamMuxDemuxError",
+    "UBloxFrame": ".StreamMuxDemux.UBloxFrame",
+    "OverflowPolicy": ".StreamMuxDemux.UBloxQueue",
+    "QueueLimits": ".StreamMuxDemux.UBloxQueue",
+    "RTCMEpochBatcher": ".RTCM.RTCMEpochBatcher",
+    "RTCMReassembler": ".RTCM.RTCMReassembler",
+    "NMEAFilter": ".NMEA.NMEAFilter",
+    "CorrectionTracer": ".Tracing.CorrectionTracer",
+    "SerialCapture": ".Capture.SerialCapture",
+    "SerialReplay": ".Capture.SerialCapture",
+    "LogSplitter": ".Capture.LogSplitter",
+    "UBXNakError": ".UBXRequester.UBXNakError",
+}
+
+__all__ = ["StreamMuxDemux", "UBXSerializer", "UBXDispatcher", "LogPipeline", "UBXConfigLoader",
+           "UBXRequester"] + list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))